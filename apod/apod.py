@@ -1,15 +1,50 @@
 import asyncio
 import datetime
 import logging
-from typing import Dict, Optional, Tuple
+import random
+import time
+from collections import deque
+from typing import List, Optional, Set, Tuple
 
 import aiohttp
 import discord
 from redbot.core import Config, checks, commands
-from redbot.core.utils.chat_formatting import humanize_list
+from redbot.core.data_manager import cog_data_path
+from redbot.core.utils.chat_formatting import box, humanize_list, pagify
+from redbot.core.utils.menus import menu
+
+from .archive import APOD_START, ArchivePrefetcher
+from .cache import TODAY, ApodCache
+from .fanout import fan_out, send_kwargs
+from .journal import PostJournal
+from .keys import DEMO_KEY, KeyPool, mask
+from .media import MediaCache, MediaHold
+from .metrics import ApodMetrics
+from .scheduler import SlotScheduler
+from .search import SearchIndex
 
 log = logging.getLogger("red.didi.apod")
 EMBED_FIELD_MAX_LENGTH = 1024
+APOD_URL = "https://api.nasa.gov/planetary/apod"
+RANGE_LIST_MAX = 50
+SEARCH_MAX_RESULTS = 100
+SEARCH_PAGE_SIZE = 10
+SEARCH_BACKFILL_BATCH = 200
+KEY_ATTEMPTS = 3  # keys tried for one fetch before giving up on a 429
+
+
+def parse_date(text: str) -> datetime.date:
+    """Parse a DD/MM/YYYY APOD date, raising ValueError with a user-facing message."""
+    try:
+        parsed = datetime.datetime.strptime(text, "%d/%m/%Y").date()
+    except ValueError:
+        raise ValueError("❌ Invalid date format. Use DD/MM/YYYY.") from None
+    today_utc = datetime.datetime.now(datetime.timezone.utc).date()
+    if parsed < APOD_START or parsed > today_utc:
+        raise ValueError(
+            f"❌ Date must be between {APOD_START.strftime('%d/%m/%Y')} and {today_utc.strftime('%d/%m/%Y')}."
+        )
+    return parsed
 
 
 class APOD(commands.Cog):
@@ -24,14 +59,50 @@ class APOD(commands.Cog):
             include_info=True,
             api_key=None,
             ping_roles=[],
+            attach_image=False,
+        )
+        self.config.register_global(
+            fanout_concurrency=10,
+            fanout_rate=40.0,
+            archive_enabled=False,
+            archive_api_key=None,
+            archive_state={},
+            key_pool=[],
         )
         self.session: Optional[aiohttp.ClientSession] = None
-        self.guild_tasks: Dict[int, asyncio.Task] = {}
+        self.scheduler = SlotScheduler(self._post_slot)
+        self.reports = deque(maxlen=10)
+        self.cache = ApodCache(cog_data_path(self) / "cache")
+        self.prefetcher = ArchivePrefetcher(self.config, self.cache, self._request_apod_range)
+        self.search_index = SearchIndex(cog_data_path(self) / "search.sqlite3")
+        self.media = MediaCache(cog_data_path(self) / "media")
+        self.keys = KeyPool()
+        self.journal = PostJournal(cog_data_path(self) / "journal.json")
+        self.metrics = ApodMetrics()
+        self._backfill_task: Optional[asyncio.Task] = None
+        self._schedule_task: Optional[asyncio.Task] = None
+
+    async def cog_load(self):
+        await self.cache.load_index()
+        await self.media.load()
+        self.keys.pool = await self.config.key_pool()
+        await self.journal.load()
+        await self.search_index.open()
+        self.cache.on_put = self.search_index.add
+        self._backfill_task = asyncio.create_task(self._backfill_search())
+        if await self.config.archive_enabled() and await self._archive_key():
+            self.prefetcher.start()
+        # on_ready doesn't fire again when the cog is reloaded on a running bot
+        self._schedule_task = asyncio.create_task(self._initial_schedule())
 
     def cog_unload(self):
-        for task in self.guild_tasks.values():
-            task.cancel()
-        self.guild_tasks.clear()
+        self.scheduler.stop()
+        if self._schedule_task is not None:
+            self._schedule_task.cancel()
+        self.prefetcher.stop()
+        if self._backfill_task is not None:
+            self._backfill_task.cancel()
+        self.search_index.close()
         if self.session is not None and not self.session.closed:
             asyncio.ensure_future(self.session.close())
 
@@ -43,31 +114,113 @@ class APOD(commands.Cog):
     async def fetch_apod(
         self, guild: Optional[discord.Guild], date: Optional[str] = None
     ) -> Tuple[Optional[dict], Optional[str]]:
-        key = "DEMO_KEY"
-        if guild is not None:
-            guild_key = await self.config.guild(guild).api_key()
-            if guild_key:
-                key = guild_key
-
+        """APOD payload for `date` (today when None), shared across guilds through the cache."""
+        guild_key = await self.config.guild(guild).api_key() if guild is not None else None
+        missed = False
+
+        def request():
+            nonlocal missed
+            missed = True
+            return self._request_with_keys(guild_key, date)
+
+        result = await self.cache.get_or_fetch(date or TODAY, request)
+        # Callers that joined another caller's in-flight fetch count as hits
+        self.metrics.incr("cache_misses" if missed else "cache_hits")
+        return result
+
+    async def _request_with_keys(
+        self, guild_key: Optional[str], date: Optional[str]
+    ) -> Tuple[Optional[dict], Optional[str]]:
+        """Try the guild's key, then the pool keys with the most budget left, moving on after a 429."""
+        error = None
+        for key in self.keys.candidates(guild_key)[:KEY_ATTEMPTS]:
+            payload, error = await self._request_apod(key, date)
+            if payload is not None or not self.keys.state(key).cooling(time.time()):
+                return payload, error
+        return None, error
+
+    async def _request_apod(self, key: str, date: Optional[str]) -> Tuple[Optional[dict], Optional[str]]:
         params = {"api_key": key}
         if date:
             params["date"] = date
 
+        self.metrics.incr("upstream_requests")
+        started = time.monotonic()
         try:
             session = await self._get_session()
-            async with session.get("https://api.nasa.gov/planetary/apod", params=params) as resp:
+            async with session.get(APOD_URL, params=params) as resp:
+                self.keys.record(key, resp.status, resp.headers)
                 if resp.status != 200:
+                    self.metrics.fail("upstream", f"status_{resp.status}")
                     return None, f"NASA API request failed (status {resp.status})."
                 payload = await resp.json(content_type=None)
         except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.metrics.fail("upstream", "network")
             return None, "Could not reach NASA APOD right now. Please try again later."
         except Exception:
+            self.metrics.fail("upstream", "invalid_response")
             return None, "Received an invalid response from NASA APOD."
+        finally:
+            self.metrics.upstream_latency.observe(time.monotonic() - started)
 
         if not isinstance(payload, dict):
+            self.metrics.fail("upstream", "invalid_payload")
             return None, "Received an invalid APOD payload."
         return payload, None
 
+    async def _backfill_search(self) -> None:
+        """Index archived days the search index hasn't seen yet (e.g. cached before it existed)."""
+        if not self.search_index.available:
+            return
+        indexed = await self.search_index.indexed_dates()
+        missing = [date for date in self.cache.dates if date not in indexed]
+        for i in range(0, len(missing), SEARCH_BACKFILL_BATCH):
+            entries = []
+            for date in missing[i:i + SEARCH_BACKFILL_BATCH]:
+                payload = await self.cache.get(date, remember=False)
+                if payload is not None:
+                    entries.append((date, payload))
+            await self.search_index.add_many(entries)
+        if missing:
+            log.info("Indexed %s archived APOD days for search", len(missing))
+
+    async def _request_apod_range(
+        self, start: datetime.date, end: datetime.date
+    ) -> Tuple[Optional[List[dict]], Optional[str], Optional[int]]:
+        """One start_date/end_date query for the archive prefetcher, with the key's remaining hourly quota."""
+        key = await self._archive_key()
+        if key is None:
+            return None, "no NASA API key set for archive downloads", None
+        params = {
+            "api_key": key,
+            "start_date": start.isoformat(),
+            "end_date": end.isoformat(),
+        }
+        try:
+            session = await self._get_session()
+            async with session.get(APOD_URL, params=params, timeout=aiohttp.ClientTimeout(total=120)) as resp:
+                self.keys.record(key, resp.status, resp.headers)
+                remaining = self.keys.state(key).budget(time.time())
+                if resp.status != 200:
+                    return None, f"status {resp.status}", remaining
+                payload = await resp.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return None, f"network error: {e!r}", None
+        except ValueError:
+            return None, "invalid JSON", None
+
+        if not isinstance(payload, list):
+            return None, "unexpected payload", remaining
+        return payload, None, remaining
+
+    async def _archive_key(self) -> Optional[str]:
+        """
+        The key for archive downloads: the archive key, else the best pool key. Never DEMO_KEY,
+        whose small per-IP allowance keyless guilds need for their daily posts.
+        """
+        candidates = self.keys.candidates(await self.config.archive_api_key(), allow_demo=False)
+        return candidates[0] if candidates else None
+
     async def send_apod(
         self,
         channel: discord.TextChannel,
@@ -85,7 +238,41 @@ class APOD(commands.Cog):
         if not data:
             await channel.send("⚠️ Could not fetch APOD data.")
             return
+        await self.post_apod(channel, data, include_info=include_info, ping_roles=ping_roles)
+
+    async def post_apod(
+        self,
+        channel: discord.TextChannel,
+        data: dict,
+        include_info: bool = True,
+        ping_roles: bool = False,
+    ) -> None:
+        """Send an already fetched APOD payload to `channel`."""
+        started = time.monotonic()
+        settings = await self.config.guild(channel.guild).all()
+        role_ids = settings["ping_roles"] if ping_roles else None
+        with self.media.hold() as media_hold:
+            messages = await self.build_messages(
+                channel, data, include_info, role_ids, settings["attach_image"], media_hold
+            )
+            for message in messages:
+                await channel.send(**send_kwargs(message))
+        self.metrics.incr("manual_posts")
+        self.metrics.manual_post_latency.observe(time.monotonic() - started)
 
+    async def build_messages(
+        self,
+        channel: discord.TextChannel,
+        data: dict,
+        include_info: bool = True,
+        ping_role_ids: Optional[List[int]] = None,
+        attach_image: bool = False,
+        media_hold: Optional[MediaHold] = None,
+    ) -> List[dict]:
+        """
+        The `channel.send()` keyword arguments for each message of an APOD post (see `send_kwargs`).
+        Attached files are added to `media_hold`, which must outlive the sends.
+        """
         raw_date = data.get("date")
         safe_date = datetime.datetime.now(datetime.timezone.utc).date()
         if isinstance(raw_date, str):
@@ -113,98 +300,176 @@ class APOD(commands.Cog):
 
         embed.set_footer(text=f"Date: {safe_date.isoformat()}")
 
-        message_content = None
-        allowed_mentions = None
-        if ping_roles:
-            role_ids = await self.config.guild(channel.guild).ping_roles()
-            roles = [channel.guild.get_role(role_id) for role_id in role_ids]
+        messages = [{"embed": embed}]
+        if ping_role_ids:
+            roles = [channel.guild.get_role(role_id) for role_id in ping_role_ids]
             roles = [role for role in roles if role is not None]
             if roles:
-                message_content = humanize_list([role.mention for role in roles])
-                allowed_mentions = discord.AllowedMentions(roles=True)
-
-        if message_content:
-            await channel.send(message_content, embed=embed, allowed_mentions=allowed_mentions)
-        else:
-            await channel.send(embed=embed)
+                messages[0]["content"] = humanize_list([role.mention for role in roles])
+                messages[0]["allowed_mentions"] = discord.AllowedMentions(roles=True)
 
         if media_type == "image":
             image_url = data.get("hdurl") or data.get("url")
             if image_url:
-                await channel.send(image_url)
+                path = await self._image_file(channel, image_url, media_hold) if attach_image else None
+                if path is not None:
+                    messages.append({"file_path": str(path), "filename": f"apod-{safe_date.isoformat()}{path.suffix}"})
+                else:
+                    messages.append({"content": image_url})
+        return messages
+
+    async def _image_file(self, channel: discord.TextChannel, image_url: str, media_hold: Optional[MediaHold] = None):
+        """The shared cached image sized for this guild's upload limit, or None to fall back to the link."""
+        me = channel.guild.me
+        if me is None or not channel.permissions_for(me).attach_files:
+            return None
+        return await self.media.for_upload(
+            await self._get_session(), image_url, channel.guild.filesize_limit, media_hold
+        )
 
-    async def _cancel_guild_task(self, guild_id: int) -> None:
-        task = self.guild_tasks.pop(guild_id, None)
-        if not task:
-            return
-        task.cancel()
+    async def _post_slot(self, post_time: str, guild_ids: List[int], scheduled: float) -> None:
+        self.metrics.incr("slots")
+        self.metrics.slot_start_lag.observe(max(0.0, time.time() - scheduled))
+        await self._post_guilds(f"{post_time} UTC", guild_ids, scheduled)
+
+    async def _post_guilds(self, label: str, guild_ids: List[int], scheduled: Optional[float] = None) -> None:
+        """
+        Post today's APOD to `guild_ids` in one paced fan-out, fetching the payload once.
+        Guilds the journal already has down for today are left out.
+        """
+        day = datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+        claimed = self.journal.claim(guild_ids, day)
+        self.metrics.incr("posts_duplicate", len(guild_ids) - len(claimed))
+        delivered = set()
         try:
-            await task
-        except asyncio.CancelledError:
-            pass
-
-    async def _next_sleep_seconds(self, post_time: str) -> float:
-        if not isinstance(post_time, str) or ":" not in post_time:
-            raise ValueError(f"Invalid post_time format: {post_time!r}")
-        parsed_time = datetime.datetime.strptime(post_time, "%H:%M")
-        hour, minute = parsed_time.hour, parsed_time.minute
-        now = datetime.datetime.now(datetime.timezone.utc)
-        target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
-        if target <= now:
-            target += datetime.timedelta(days=1)
-        return (target - now).total_seconds()
-
-    async def _guild_scheduler(self, guild_id: int) -> None:
-        while True:
-            try:
-                post_time = await self.config.guild_from_id(guild_id).post_time()
-                try:
-                    sleep_seconds = await self._next_sleep_seconds(post_time)
-                except Exception:
-                    log.exception("Invalid APOD post_time for guild %s: %r", guild_id, post_time)
-                    sleep_seconds = 60.0
-
-                await asyncio.sleep(sleep_seconds)
-
-                guild = self.bot.get_guild(guild_id)
-                if guild is None:
-                    continue
-
-                channel_id = await self.config.guild(guild).channel_id()
-                channel = guild.get_channel(channel_id) if channel_id else None
-                if not isinstance(channel, discord.TextChannel):
-                    continue
-
-                include_info = await self.config.guild(guild).include_info()
-                await self.send_apod(channel, include_info=include_info, ping_roles=True)
-            except asyncio.CancelledError:
-                raise
-            except Exception:
-                log.exception("Unexpected error in APOD scheduler for guild %s", guild_id)
-                await asyncio.sleep(60)
-
-    async def restart_guild_task(self, guild: discord.Guild) -> None:
-        await self._cancel_guild_task(guild.id)
-
-        channel_id = await self.config.guild(guild).channel_id()
-        post_time = await self.config.guild(guild).post_time()
-        if not channel_id:
-            return
-
-        channel = guild.get_channel(channel_id)
+            delivered = await self._deliver(label, claimed, scheduled)
+        finally:
+            await self.journal.commit(claimed, delivered, day)
+
+    async def _deliver(self, label: str, guild_ids: List[int], scheduled: Optional[float] = None) -> Set[int]:
+        """Send the APOD to each guild's channel; returns the guilds that got it."""
+        targets = []
+        for guild_id in guild_ids:
+            guild = self.bot.get_guild(guild_id)
+            if guild is None:
+                continue
+            settings = await self.config.guild(guild).all()
+            channel = guild.get_channel(settings["channel_id"]) if settings["channel_id"] else None
+            if not isinstance(channel, discord.TextChannel):
+                continue
+            targets.append((guild, channel, settings))
+        if not targets:
+            return set()
+
+        keyed = next((guild for guild, _channel, settings in targets if settings["api_key"]), None)
+        data, error = await self.fetch_apod(keyed)
+        limits = await self.config.all()
+        # Every file put in a delivery stays on disk until the whole fan-out is done
+        with self.media.hold() as media_hold:
+            deliveries = []
+            for _guild, channel, settings in targets:
+                if error or not data:
+                    messages = [{"content": f"⚠️ {error or 'Could not fetch APOD data.'}"}]
+                else:
+                    messages = await self.build_messages(
+                        channel,
+                        data,
+                        settings["include_info"],
+                        settings["ping_roles"],
+                        settings["attach_image"],
+                        media_hold,
+                    )
+                deliveries.append((channel, messages))
+            report = await fan_out(label, deliveries, limits["fanout_concurrency"], limits["fanout_rate"])
+        self.reports.append(report)
+        self._record_report(report, scheduled)
+        log.info("APOD slot %s", report)
+        # A fetch error still posts a warning, but the day counts as missed
+        return set(report.delivered) if data and not error else set()
+
+    def _record_report(self, report, scheduled: Optional[float]) -> None:
+        self.metrics.incr("posts_sent", report.sent)
+        self.metrics.incr("posts_skipped", report.skipped)
+        for reason, count in report.failures.items():
+            self.metrics.fail("post", reason, count)
+        for reason, count in report.followup_failures.items():
+            self.metrics.fail("post_followup", reason, count)
+        if scheduled is not None:
+            for offset in report.delivered_after:
+                self.metrics.post_lag.observe(max(0.0, report.started_at + offset - scheduled))
+
+    def _schedule_guild(self, guild: discord.Guild, settings: dict) -> bool:
+        """Schedule `guild` from its stored settings, or drop it when no valid channel is set."""
+        channel_id = settings.get("channel_id")
+        channel = guild.get_channel(channel_id) if channel_id else None
         if not isinstance(channel, discord.TextChannel):
-            return
-
+            self.scheduler.unschedule(guild.id)
+            return False
+        post_time = settings.get("post_time")
         try:
-            datetime.datetime.strptime(post_time, "%H:%M")
-        except ValueError:
-            return
-
-        self.guild_tasks[guild.id] = asyncio.create_task(
-            self._guild_scheduler(guild.id), name=f"apod-scheduler-{guild.id}"
-        )
+            self.scheduler.schedule(guild.id, post_time)
+        except (TypeError, ValueError):
+            log.error("Invalid APOD post_time for guild %s: %r", guild.id, post_time)
+            self.scheduler.unschedule(guild.id)
+            return False
+        return True
 
-    @commands.command()
+    async def restart_guild_task(self, guild: discord.Guild) -> None:
+        """(Re)schedule a guild's daily post after its settings changed."""
+        if self._schedule_guild(guild, await self.config.guild(guild).all()):
+            self.scheduler.start()
+
+    async def schedule_all(self) -> None:
+        """
+        Schedule every configured guild from a single `all_guilds()` read.
+
+        Only guilds with stored settings are visited, so servers that never
+        set a channel cost nothing. Guilds whose slot hasn't changed are left
+        alone by the scheduler, which makes repeated calls cheap.
+        """
+        started = time.monotonic()
+        all_guilds = await self.config.all_guilds()
+        scheduled = set()
+        for guild_id, settings in all_guilds.items():
+            if not settings.get("channel_id"):
+                continue
+            guild = self.bot.get_guild(guild_id)
+            if guild is not None and self._schedule_guild(guild, settings):
+                scheduled.add(guild_id)
+        for guild_id in [guild_id for guild_id in self.scheduler.guild_ids() if guild_id not in scheduled]:
+            self.scheduler.unschedule(guild_id)
+        if scheduled:
+            self.scheduler.start()
+        self.metrics.last_schedule_pass = time.monotonic() - started
+        log.debug("Scheduled APOD for %s guild(s) in %.3fs", len(scheduled), self.metrics.last_schedule_pass)
+
+    async def _initial_schedule(self) -> None:
+        await self.bot.wait_until_red_ready()
+        await self.schedule_all()
+        await self.catch_up()
+
+    async def catch_up(self) -> None:
+        """
+        Post to guilds whose slot already passed today while the bot was down.
+
+        Only guilds with a journal entry are considered, so setting a channel
+        after today's slot doesn't trigger a post on the next restart.
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        day, clock = now.date().isoformat(), now.time()
+        missed = [
+            guild_id
+            for guild_id in self.scheduler.guild_ids()
+            # Stored times may be unpadded ("9:00"), so compare parsed times rather than strings
+            if datetime.datetime.strptime(self.scheduler.post_time(guild_id), "%H:%M").time() <= clock
+            and self.journal.last(guild_id) not in (None, day)
+        ]
+        if missed:
+            log.info("Catching up on today's APOD for %s guild(s)", len(missed))
+            self.metrics.incr("catch_up_passes")
+            await self._post_guilds("catch-up", missed)
+
+    @commands.group(invoke_without_command=True)
     async def apod(self, ctx: commands.Context, date: Optional[str] = None):
         """Get APOD. Optional date format: DD/MM/YYYY (from 16/06/1995 to today UTC)."""
         if ctx.guild is None:
@@ -214,22 +479,80 @@ class APOD(commands.Cog):
         parsed_date = None
         if date is not None:
             try:
-                parsed_dt = datetime.datetime.strptime(date, "%d/%m/%Y").date()
-            except ValueError:
-                await ctx.send("❌ Invalid date format. Use DD/MM/YYYY.")
-                return
-            apod_start = datetime.date(1995, 6, 16)
-            today_utc = datetime.datetime.now(datetime.timezone.utc).date()
-            if parsed_dt < apod_start or parsed_dt > today_utc:
-                await ctx.send(
-                    f"❌ Date must be between {apod_start.strftime('%d/%m/%Y')} and {today_utc.strftime('%d/%m/%Y')}."
-                )
+                parsed_date = parse_date(date).strftime("%Y-%m-%d")
+            except ValueError as e:
+                await ctx.send(str(e))
                 return
-            parsed_date = parsed_dt.strftime("%Y-%m-%d")
 
         include_info = await self.config.guild(ctx.guild).include_info()
         await self.send_apod(ctx.channel, date=parsed_date, include_info=include_info, ping_roles=False)
 
+    @apod.command(name="random")
+    async def apod_random(self, ctx: commands.Context):
+        """Post a random APOD from the local archive."""
+        if ctx.guild is None:
+            await ctx.send("❌ This command can only be used in a server.")
+            return
+        if not self.cache.dates:
+            await ctx.send("❌ The local APOD archive is empty. The bot owner can enable it with `[p]apodset archive`.")
+            return
+        data = await self.cache.get(random.choice(self.cache.dates))
+        if data is None:
+            await ctx.send("⚠️ Could not read that APOD from the local archive.")
+            return
+        include_info = await self.config.guild(ctx.guild).include_info()
+        await self.post_apod(ctx.channel, data, include_info=include_info, ping_roles=False)
+
+    @apod.command(name="search")
+    async def apod_search(self, ctx: commands.Context, *, terms: str):
+        """Search archived APOD titles and explanations."""
+        if not self.search_index.available:
+            await ctx.send("❌ Search is not available on this bot.")
+            return
+        total, hits = await self.search_index.search(terms, limit=SEARCH_MAX_RESULTS)
+        if not hits:
+            await ctx.send("No archived APODs match that search.")
+            return
+
+        color = await ctx.embed_color()
+        pages = []
+        page_count = (len(hits) + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE
+        for number, start in enumerate(range(0, len(hits), SEARCH_PAGE_SIZE), 1):
+            lines = []
+            for date, title, snippet in hits[start:start + SEARCH_PAGE_SIZE]:
+                shown = datetime.date.fromisoformat(date).strftime("%d/%m/%Y")
+                lines.append(f"`{shown}` **{title or 'Untitled'}**\n{snippet}")
+            embed = discord.Embed(title=f"APOD search: {terms}"[:256], description="\n\n".join(lines)[:4096], color=color)
+            embed.set_footer(text=f"Page {number}/{page_count} · {total} match(es)")
+            pages.append(embed)
+        await menu(ctx, pages)
+
+    @apod.command(name="range")
+    async def apod_range(self, ctx: commands.Context, start: str, end: str):
+        """List archived APODs between two dates (DD/MM/YYYY)."""
+        if ctx.guild is None:
+            await ctx.send("❌ This command can only be used in a server.")
+            return
+        try:
+            first, last = sorted((parse_date(start), parse_date(end)))
+        except ValueError as e:
+            await ctx.send(str(e))
+            return
+
+        dates = self.cache.dates_between(first.isoformat(), last.isoformat())
+        if not dates:
+            await ctx.send("No APODs in the local archive for those dates.")
+            return
+        lines = []
+        for date in dates[:RANGE_LIST_MAX]:
+            data = await self.cache.get(date) or {}
+            shown = datetime.date.fromisoformat(date).strftime("%d/%m/%Y")
+            lines.append(f"`{shown}` {data.get('title') or 'Untitled'}")
+        if len(dates) > RANGE_LIST_MAX:
+            lines.append(f"…and {len(dates) - RANGE_LIST_MAX} more. Use `{ctx.clean_prefix}apod DD/MM/YYYY` to view one.")
+        for page in pagify("\n".join(lines)):
+            await ctx.send(page)
+
     @commands.group()
     @checks.admin_or_permissions(manage_guild=True)
     async def apodset(self, ctx: commands.Context):
@@ -255,8 +578,10 @@ class APOD(commands.Cog):
                         f"Channel: {channel.mention if channel else 'Not set'}",
                         f"Post Time (UTC): {post_time}",
                         f"Include Info: {include_info}",
-                        f"API Key: {'Set' if api_key else 'Not set'}",
+                        f"Attach Image: {await self.config.guild(ctx.guild).attach_image()}",
+                        f"API Key: {self.keys.describe(api_key) if api_key else 'Not set (using the shared key pool)'}",
                         f"Ping Roles: {humanize_list(roles) if roles else 'None'}",
+                        f"Last Scheduled Post (UTC day): {self.journal.last(ctx.guild.id) or 'Never'}",
                     ]
                 )
             )
@@ -272,7 +597,7 @@ class APOD(commands.Cog):
     async def time(self, ctx: commands.Context, time: str):
         """Set UTC time for daily APOD posts. Format HH:MM."""
         try:
-            datetime.datetime.strptime(time, "%H:%M")
+            time = datetime.datetime.strptime(time, "%H:%M").strftime("%H:%M")
         except ValueError:
             await ctx.send("❌ Invalid time format. Use HH:MM")
             return
@@ -288,6 +613,111 @@ class APOD(commands.Cog):
         await self.restart_guild_task(ctx.guild)
         await ctx.send(f"✅ Include info set to {value}.")
 
+    @apodset.command()
+    @checks.is_owner()
+    async def fanout(self, ctx: commands.Context, concurrency: int, per_second: float):
+        """Set how many channels scheduled posts go to at once, and the overall messages per second."""
+        if concurrency < 1 or per_second <= 0:
+            await ctx.send("❌ Concurrency must be at least 1 and the rate above 0.")
+            return
+        await self.config.fanout_concurrency.set(concurrency)
+        await self.config.fanout_rate.set(per_second)
+        await ctx.send(f"✅ Scheduled posts go to {concurrency} channels at once, at most {per_second:g} messages/s.")
+
+    @apodset.command()
+    @checks.is_owner()
+    async def deliveries(self, ctx: commands.Context):
+        """Show delivery reports for the most recent scheduled post slots."""
+        if not self.reports:
+            await ctx.send("No scheduled posts have gone out since the cog was loaded.")
+            return
+        lines = []
+        for report in reversed(self.reports):
+            when = datetime.datetime.fromtimestamp(report.started_at, datetime.timezone.utc)
+            lines.append(f"{when:%Y-%m-%d} {report}")
+        await ctx.send(box("\n".join(lines)))
+
+    @apodset.command()
+    @checks.is_owner()
+    async def stats(self, ctx: commands.Context):
+        """Show fetch, cache and posting statistics since the cog was loaded."""
+        lines = self.metrics.lines()
+        lines.append(f"Scheduled guilds: {len(self.scheduler)}")
+        await ctx.send(box("\n".join(lines)))
+
+    @apodset.group(name="archive", invoke_without_command=True)
+    @checks.is_owner()
+    async def archive(self, ctx: commands.Context):
+        """Show the local APOD archive status."""
+        state = await self.config.archive_state()
+        covered = f"{state['oldest']} to {state['newest']}" if state.get("oldest") else "nothing yet"
+        lines = [
+            "**APOD Archive:**",
+            f"Prefetch: {'Running' if self.prefetcher.running else 'Stopped'}",
+            f"Archived days: {len(self.cache.dates)} (fetched {covered})",
+            f"API Key: {'Set' if await self.config.archive_api_key() else 'Shared key pool' if self.keys.pool else 'None (DEMO_KEY is not used)'}",
+        ]
+        if self.prefetcher.last_error:
+            lines.append(f"Last error: {self.prefetcher.last_error}")
+        await ctx.send("\n".join(lines))
+
+    @archive.command(name="toggle")
+    async def archive_toggle(self, ctx: commands.Context, value: bool):
+        """Enable/disable downloading the whole APOD archive in the background (needs an archive or pool key)."""
+        if value and not await self._archive_key():
+            await ctx.send(
+                f"❌ Archive downloads need a NASA API key; set one with `{ctx.clean_prefix}apodset archive key` "
+                f"or `{ctx.clean_prefix}apodset keypool add`. DEMO_KEY is kept for daily posts."
+            )
+            return
+        await self.config.archive_enabled.set(value)
+        if value:
+            self.prefetcher.start()
+        else:
+            self.prefetcher.stop()
+        await ctx.send(f"✅ Archive prefetch {'enabled' if value else 'disabled'}.")
+
+    @archive.command(name="key")
+    async def archive_key(self, ctx: commands.Context, *, key: str = None):
+        """Set the NASA API key used for archive downloads (leave empty to use the shared key pool)."""
+        await self.config.archive_api_key.set(key)
+        await ctx.send("✅ Archive API key set." if key else "✅ Archive downloads will use the shared key pool.")
+
+    @apodset.command()
+    async def attachimage(self, ctx: commands.Context, value: bool):
+        """Upload the APOD image to Discord instead of posting its link."""
+        await self.config.guild(ctx.guild).attach_image.set(value)
+        await ctx.send(f"✅ Attach image set to {value}.")
+
+    @apodset.group(name="keypool", invoke_without_command=True)
+    @checks.is_owner()
+    async def keypool(self, ctx: commands.Context):
+        """Show the health of the shared NASA keys used by servers without their own key."""
+        lines = [self.keys.describe(key) for key in self.keys.pool + [DEMO_KEY]]
+        guild_keys = len([key for key in self.keys.states if key not in self.keys.pool and key != DEMO_KEY])
+        lines.append(f"{guild_keys} server key(s) seen since load.")
+        await ctx.send(box("\n".join(lines)))
+
+    @keypool.command(name="add")
+    async def keypool_add(self, ctx: commands.Context, key: str):
+        """Add a NASA API key to the shared pool."""
+        async with self.config.key_pool() as pool:
+            if key not in pool:
+                pool.append(key)
+            self.keys.pool = list(pool)
+        await ctx.send(f"✅ Added {mask(key)} to the key pool ({len(self.keys.pool)} key(s)).")
+
+    @keypool.command(name="remove")
+    async def keypool_remove(self, ctx: commands.Context, key: str):
+        """Remove a NASA API key from the shared pool."""
+        async with self.config.key_pool() as pool:
+            if key not in pool:
+                await ctx.send("❌ That key is not in the pool.")
+                return
+            pool.remove(key)
+            self.keys.pool = list(pool)
+        await ctx.send(f"✅ Removed {mask(key)} from the key pool.")
+
     @apodset.command()
     async def apikey(self, ctx: commands.Context, *, key: str):
         """Set NASA API key."""
@@ -307,8 +737,9 @@ class APOD(commands.Cog):
 
     @commands.Cog.listener()
     async def on_ready(self):
-        for guild in self.bot.guilds:
-            await self.restart_guild_task(guild)
+        # Fires again after every reconnect; only re-run the bulk pass when one isn't already in flight
+        if self._schedule_task is None or self._schedule_task.done():
+            self._schedule_task = asyncio.create_task(self.schedule_all())
 
     @commands.Cog.listener()
     async def on_guild_join(self, guild: discord.Guild):
@@ -316,4 +747,5 @@ class APOD(commands.Cog):
 
     @commands.Cog.listener()
     async def on_guild_remove(self, guild: discord.Guild):
-        await self._cancel_guild_task(guild.id)
+        self.scheduler.unschedule(guild.id)
+        self.journal.forget(guild.id)
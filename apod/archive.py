@@ -0,0 +1,116 @@
+import asyncio
+import datetime
+import logging
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from .cache import ApodCache
+
+log = logging.getLogger("red.didi.apod")
+
+APOD_START = datetime.date(1995, 6, 16)
+BATCH_DAYS = 100
+# Remaining-quota level below which the prefetcher waits for the hourly window to refill
+LOW_QUOTA = 5
+MAX_BACKOFF = 3600.0
+
+# (start, end) -> (payloads, error, X-RateLimit-Remaining)
+RangeRequest = Callable[[datetime.date, datetime.date], Awaitable[Tuple[Optional[List[dict]], Optional[str], Optional[int]]]]
+
+
+def _parse(value: Optional[str]) -> Optional[datetime.date]:
+    try:
+        return datetime.date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+class ArchivePrefetcher:
+    """
+    Pulls the whole APOD archive into the local cache in `start_date`/`end_date` batches.
+
+    New days are fetched first (up to yesterday, since today's entry can
+    still change), then the prefetcher walks back towards 1995-06-16.
+    Progress is kept in the `archive_state` global so restarts resume where
+    they left off. Batches are spaced `interval` seconds apart, failures
+    back off exponentially and a nearly exhausted key waits for its hourly
+    window to refill.
+    """
+
+    def __init__(self, config, cache: ApodCache, request_range: RangeRequest, interval: float = 60.0):
+        self.config = config
+        self.cache = cache
+        self.request_range = request_range
+        self.interval = interval
+        self.last_error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if not self.running:
+            self._task = asyncio.create_task(self._run(), name="apod-archive-prefetch")
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _next_batch(self) -> Optional[Tuple[datetime.date, datetime.date]]:
+        state = await self.config.archive_state()
+        yesterday = datetime.datetime.now(datetime.timezone.utc).date() - datetime.timedelta(days=1)
+        newest, oldest = _parse(state.get("newest")), _parse(state.get("oldest"))
+        if newest is None or newest < yesterday:
+            start = newest + datetime.timedelta(days=1) if newest else yesterday - datetime.timedelta(days=BATCH_DAYS - 1)
+            return max(start, APOD_START), min(start + datetime.timedelta(days=BATCH_DAYS - 1), yesterday)
+        if oldest is not None and oldest > APOD_START:
+            end = oldest - datetime.timedelta(days=1)
+            return max(APOD_START, end - datetime.timedelta(days=BATCH_DAYS - 1)), end
+        return None
+
+    async def _record(self, start: datetime.date, end: datetime.date) -> None:
+        async with self.config.archive_state() as state:
+            newest, oldest = _parse(state.get("newest")), _parse(state.get("oldest"))
+            state["newest"] = max(end, newest).isoformat() if newest else end.isoformat()
+            state["oldest"] = min(start, oldest).isoformat() if oldest else start.isoformat()
+
+    async def _run(self) -> None:
+        backoff = self.interval
+        while True:
+            batch = await self._next_batch()
+            if batch is None:
+                # Caught up; check again for new days in a few hours
+                await asyncio.sleep(6 * 3600)
+                continue
+            start, end = batch
+            try:
+                payloads, error, remaining = await self.request_range(start, end)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.exception("APOD archive batch %s..%s failed", start, end)
+                payloads, error, remaining = None, str(e), None
+
+            if error is not None or payloads is None:
+                self.last_error = error
+                # An exhausted key only refills with the hourly window
+                wait = MAX_BACKOFF if remaining == 0 else backoff
+                log.warning("APOD archive batch %s..%s failed: %s (retrying in %.0fs)", start, end, error, wait)
+                await asyncio.sleep(wait)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+                continue
+
+            self.last_error = None
+            backoff = self.interval
+            for payload in payloads:
+                date = payload.get("date") if isinstance(payload, dict) else None
+                if isinstance(date, str) and _parse(date) is not None:
+                    await self.cache.put(date, payload, remember=False)
+            await self._record(start, end)
+            log.debug("APOD archive stored %s entries for %s..%s", len(payloads), start, end)
+
+            pause = self.interval
+            if remaining is not None and remaining < LOW_QUOTA:
+                pause = max(pause, MAX_BACKOFF)
+            await asyncio.sleep(pause)
@@ -0,0 +1,185 @@
+import asyncio
+import bisect
+import datetime
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+log = logging.getLogger("red.didi.apod")
+
+TODAY = "today"
+
+FetchResult = Tuple[Optional[dict], Optional[str]]
+
+
+def _utc_today() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+
+
+def _write_json(path: Path, data: dict) -> None:
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _is_date(key: str) -> bool:
+    try:
+        datetime.datetime.strptime(key, "%Y-%m-%d")
+    except ValueError:
+        return False
+    return True
+
+
+def _stored_dates(path: Path) -> List[str]:
+    return sorted(entry.stem for entry in path.glob("*.json") if _is_date(entry.stem))
+
+
+def _read_json(path: Path) -> Optional[dict]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        log.warning("Ignoring unreadable APOD cache file %s", path)
+        return None
+
+
+class ApodCache:
+    """
+    Two-tier cache of APOD payloads keyed by date (`YYYY-MM-DD`, or `today`).
+
+    Entries live in an in-memory LRU and as one JSON file per key under
+    `path`. Past dates never change, so they are kept forever; today's
+    entry (and the `today` key) is refetched after `today_ttl` seconds.
+    Concurrent misses for the same key share one upstream fetch, and a
+    stale entry is served if refreshing it fails (for `today`, only while it
+    still is today's picture). The sorted list of dates
+    held on disk doubles as the local archive index.
+    """
+
+    def __init__(self, path: Optional[Path], max_entries: int = 256, today_ttl: float = 900.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.today_ttl = today_ttl
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._flights: Dict[str, asyncio.Task] = {}
+        self.dates: List[str] = []
+        self._date_set: Set[str] = set()
+        # Called with (date, payload) whenever a dated payload is stored, e.g. to index it for search
+        self.on_put: Optional[Callable[[str, dict], Awaitable[None]]] = None
+        if path is not None:
+            path.mkdir(parents=True, exist_ok=True)
+
+    async def load_index(self) -> None:
+        """Index the dates already stored on disk."""
+        if self.path is None:
+            return
+        stored = await asyncio.get_running_loop().run_in_executor(None, _stored_dates, self.path)
+        self._date_set.update(stored)
+        self.dates = sorted(self._date_set)
+
+    def _index(self, key: str) -> None:
+        if key not in self._date_set:
+            self._date_set.add(key)
+            bisect.insort(self.dates, key)
+
+    def dates_between(self, start: str, end: str) -> List[str]:
+        """Archived dates from `start` to `end` inclusive (`YYYY-MM-DD`)."""
+        return self.dates[bisect.bisect_left(self.dates, start):bisect.bisect_right(self.dates, end)]
+
+    def _file(self, key: str) -> Path:
+        return self.path / f"{key}.json"
+
+    def _fresh(self, key: str, fetched_at: float) -> bool:
+        if key != TODAY and key < _utc_today():
+            return True
+        return time.time() - fetched_at < self.today_ttl
+
+    def _stale_usable(self, key: str, payload: dict) -> bool:
+        """Whether a stale entry may stand in for a failed refresh; an old `today` would pass off a past picture."""
+        return key != TODAY or payload.get("date") == _utc_today()
+
+    def _remember(self, key: str, fetched_at: float, payload: dict) -> None:
+        self._memory[key] = (fetched_at, payload)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def _lookup(self, key: str, remember: bool = True) -> Optional[Tuple[float, dict]]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            return entry
+        if self.path is None:
+            return None
+        stored = await asyncio.get_running_loop().run_in_executor(None, _read_json, self._file(key))
+        if not isinstance(stored, dict) or not isinstance(stored.get("payload"), dict):
+            return None
+        entry = (float(stored.get("fetched_at", 0)), stored["payload"])
+        if remember:
+            self._remember(key, *entry)
+        return entry
+
+    async def get(self, key: str, remember: bool = True) -> Optional[dict]:
+        """The stored payload for `key`, however old, without ever going upstream."""
+        entry = await self._lookup(key, remember)
+        return entry[1] if entry is not None else None
+
+    async def put(self, key: str, payload: dict, remember: bool = True) -> None:
+        """Store a payload; bulk loads pass `remember=False` to keep the memory tier for hot dates."""
+        fetched_at = time.time()
+        if remember:
+            self._remember(key, fetched_at, payload)
+        if self.path is None:
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None, _write_json, self._file(key), {"fetched_at": fetched_at, "payload": payload}
+            )
+        except OSError:
+            log.exception("Failed to write APOD cache entry %s", key)
+            return
+        if key == TODAY:
+            return
+        self._index(key)
+        if self.on_put is not None:
+            try:
+                await self.on_put(key, payload)
+            except Exception:
+                log.exception("APOD cache hook failed for %s", key)
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[FetchResult]]) -> FetchResult:
+        """The cached payload for `key`, or the result of `fetch()` shared with any concurrent callers."""
+        entry = await self._lookup(key)
+        if entry is not None and self._fresh(key, entry[0]):
+            self.hits += 1
+            return entry[1], None
+        flight = self._flights.get(key)
+        if flight is None:
+            self.misses += 1
+            flight = self._flights[key] = asyncio.ensure_future(self._refresh(key, fetch, entry))
+            flight.add_done_callback(lambda _task: self._flights.pop(key, None))
+        else:
+            self.hits += 1
+        return await asyncio.shield(flight)
+
+    async def _refresh(self, key: str, fetch, stale: Optional[Tuple[float, dict]]) -> FetchResult:
+        payload, error = await fetch()
+        if error is not None or payload is None:
+            if stale is not None and self._stale_usable(key, stale[1]):
+                log.warning("Serving stale APOD payload for %s: %s", key, error)
+                return stale[1], None
+            return None, error
+        await self.put(key, payload)
+        date = payload.get("date")
+        if key == TODAY and isinstance(date, str) and _is_date(date):
+            await self.put(date, payload)
+        return payload, None
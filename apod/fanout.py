@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+import discord
+
+log = logging.getLogger("red.didi.apod")
+
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY = 1.0
+
+# (channel, messages) where each message is a dict of channel.send() keyword arguments
+Delivery = Tuple[discord.TextChannel, List[dict]]
+
+
+def send_kwargs(message: dict) -> dict:
+    """
+    `channel.send()` arguments for a built message. Messages carrying a
+    cached file use `file_path`/`filename`, and get a fresh discord.File per
+    attempt because a sent (or failed) File is closed.
+    """
+    if "file_path" not in message:
+        return message
+    kwargs = {k: v for k, v in message.items() if k not in ("file_path", "filename")}
+    kwargs["file"] = discord.File(message["file_path"], filename=message["filename"])
+    return kwargs
+
+
+class Pacer:
+    """Spaces sends at most `rate` per second across all workers; a 429 pushes everyone back."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._next = 0.0
+
+    async def wait(self) -> None:
+        if self.rate <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now, self._next)
+        self._next = slot + 1 / self.rate
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def penalize(self, delay: float) -> None:
+        self._next = max(self._next, asyncio.get_running_loop().time() + delay)
+
+
+class DeliveryReport:
+    """Outcome of one fan-out: counts per result, failure reasons and how long it took."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.started_at = time.time()
+        self.sent = 0
+        self.failed = 0
+        self.skipped = 0
+        self.retries = 0
+        self.duration = 0.0
+        self.failures: Dict[str, int] = {}
+        # Follow-up messages (image/link) that failed after the embed went out; the guild still counts as sent
+        self.followup_failures: Dict[str, int] = {}
+        self.delivered: List[int] = []  # guild ids
+        self.delivered_after: List[float] = []  # seconds from the start of the fan-out, per delivered guild
+
+    @property
+    def total(self) -> int:
+        return self.sent + self.failed + self.skipped
+
+    def fail(self, reason: str) -> None:
+        self.failed += 1
+        self.failures[reason] = self.failures.get(reason, 0) + 1
+
+    def fail_followup(self, reason: str) -> None:
+        self.followup_failures[reason] = self.followup_failures.get(reason, 0) + 1
+
+    def __str__(self) -> str:
+        text = (
+            f"{self.label}: {self.sent} sent, {self.failed} failed, "
+            f"{self.skipped} skipped (missing permissions) in {self.duration:.1f}s"
+        )
+        if self.retries:
+            text += f", {self.retries} retries"
+        if self.failures:
+            text += " [" + ", ".join(f"{reason}: {count}" for reason, count in sorted(self.failures.items())) + "]"
+        if self.followup_failures:
+            text += " [follow-up " + ", ".join(
+                f"{reason}: {count}" for reason, count in sorted(self.followup_failures.items())
+            ) + "]"
+        return text
+
+
+def can_post(channel: discord.TextChannel) -> bool:
+    me = channel.guild.me
+    if me is None:
+        return False
+    permissions = channel.permissions_for(me)
+    return permissions.send_messages and permissions.embed_links
+
+
+async def send_with_retry(
+    channel: discord.abc.Messageable, kwargs: dict, pacer: Pacer, report: Optional[DeliveryReport] = None
+) -> discord.Message:
+    """Send one message, retrying rate limits and transient Discord/network errors."""
+    attempt = 0
+    while True:
+        await pacer.wait()
+        try:
+            return await channel.send(**send_kwargs(kwargs))
+        except discord.RateLimited as e:
+            error = e
+            delay = e.retry_after
+            pacer.penalize(delay)
+        except discord.HTTPException as e:
+            error = e
+            if e.status == 429:
+                delay = RETRY_BASE_DELAY * 2 ** attempt
+                pacer.penalize(delay)
+            elif e.status < 500:
+                raise
+            else:
+                delay = RETRY_BASE_DELAY * 2 ** attempt
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error = e
+            delay = RETRY_BASE_DELAY * 2 ** attempt
+        attempt += 1
+        if attempt >= RETRY_ATTEMPTS:
+            raise error
+        if report is not None:
+            report.retries += 1
+        await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+
+def _failure_reason(error: Exception) -> str:
+    if isinstance(error, discord.Forbidden):
+        return "forbidden"
+    if isinstance(error, discord.NotFound):
+        return "channel_missing"
+    if isinstance(error, discord.RateLimited):
+        return "rate_limited"
+    if isinstance(error, discord.HTTPException):
+        return f"http_{error.status}"
+    if isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError)):
+        return "network"
+    return "unexpected"
+
+
+async def fan_out(
+    label: str,
+    deliveries: Iterable[Delivery],
+    concurrency: int,
+    rate: float,
+) -> DeliveryReport:
+    """
+    Send each channel its messages with at most `concurrency` channels in
+    flight and `rate` messages per second overall. A channel's messages go
+    out in order and each one is retried on its own, so a retry never
+    repeats an earlier message.
+    """
+    report = DeliveryReport(label)
+    pacer = Pacer(rate)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    started = time.monotonic()
+
+    async def deliver(channel: discord.TextChannel, messages: List[dict]) -> None:
+        if not can_post(channel):
+            report.skipped += 1
+            return
+        sent = 0
+        async with semaphore:
+            try:
+                for kwargs in messages:
+                    await send_with_retry(channel, kwargs, pacer, report)
+                    sent += 1
+            except Exception as e:
+                reason = _failure_reason(e)
+                if reason == "unexpected":
+                    log.exception("Unexpected error posting APOD to channel %s", channel.id)
+                if sent:
+                    # The embed is out; failing the guild would get it posted again by a retry or catch-up
+                    report.fail_followup(reason)
+                elif reason == "forbidden":
+                    report.skipped += 1
+                    return
+                else:
+                    report.fail(reason)
+                    return
+        report.sent += 1
+        report.delivered.append(channel.guild.id)
+        report.delivered_after.append(time.monotonic() - started)
+
+    await asyncio.gather(*(deliver(channel, messages) for channel, messages in deliveries))
+    report.duration = time.monotonic() - started
+    return report
@@ -0,0 +1,82 @@
+import asyncio
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+log = logging.getLogger("red.didi.apod")
+
+
+def _read(path: Path) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError):
+        log.warning("Ignoring unreadable APOD post journal %s", path)
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _write(path: Path, data: Dict[str, str]) -> None:
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+class PostJournal:
+    """
+    The UTC day each guild last received its scheduled APOD, kept in one JSON file.
+
+    A post `claim`s its guilds for a day before sending, so a slot and a
+    catch-up pass (or two slots after a `post_time` change) can't both post
+    to the same guild. Guilds that got the post are `commit`ted and the file
+    is rewritten once per fan-out; the rest are released to be retried.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._last: Dict[int, str] = {}
+        self._claimed: Dict[int, str] = {}
+        self._lock = asyncio.Lock()
+
+    async def load(self) -> None:
+        data = await asyncio.get_running_loop().run_in_executor(None, _read, self.path)
+        for guild_id, day in data.items():
+            if isinstance(day, str) and guild_id.isdigit():
+                self._last[int(guild_id)] = day
+
+    def last(self, guild_id: int) -> Optional[str]:
+        return self._last.get(guild_id)
+
+    def posted(self, guild_id: int, day: str) -> bool:
+        return self._last.get(guild_id) == day or self._claimed.get(guild_id) == day
+
+    def claim(self, guild_ids: Iterable[int], day: str) -> List[int]:
+        """The guilds not yet posted (or being posted) for `day`, now reserved for the caller."""
+        claimed = []
+        for guild_id in guild_ids:
+            if not self.posted(guild_id, day):
+                self._claimed[guild_id] = day
+                claimed.append(guild_id)
+        return claimed
+
+    async def commit(self, guild_ids: Iterable[int], delivered: Set[int], day: str) -> None:
+        """Record `day` for the claimed guilds in `delivered` and release the rest."""
+        for guild_id in guild_ids:
+            if self._claimed.get(guild_id) == day:
+                del self._claimed[guild_id]
+            if guild_id in delivered:
+                self._last[guild_id] = day
+        async with self._lock:
+            data = {str(guild_id): day for guild_id, day in self._last.items()}
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, _write, self.path, data)
+            except OSError:
+                log.exception("Could not save the APOD post journal")
+
+    def forget(self, guild_id: int) -> None:
+        self._last.pop(guild_id, None)
@@ -0,0 +1,124 @@
+import time
+from typing import Dict, Iterable, List, Optional
+
+DEMO_KEY = "DEMO_KEY"
+# What NASA grants per rolling hour when we haven't seen a header yet
+DEFAULT_LIMITS = {DEMO_KEY: 30}
+DEFAULT_LIMIT = 1000
+WINDOW = 3600.0
+BACKOFF_BASE = 60.0
+BACKOFF_MAX = 3600.0
+
+
+def mask(key: str) -> str:
+    if key == DEMO_KEY:
+        return key
+    return f"{key[:4]}…{key[-4:]}" if len(key) > 8 else "…" + key[-2:]
+
+
+def _header_int(headers, name: str) -> Optional[int]:
+    value = headers.get(name) if headers is not None else None
+    return int(value) if value and value.isdigit() else None
+
+
+class KeyState:
+    """What we know about one key's hourly budget and recent failures."""
+
+    __slots__ = ("key", "limit", "remaining", "updated", "cooldown_until", "strikes", "requests", "throttled")
+
+    def __init__(self, key: str):
+        self.key = key
+        self.limit = DEFAULT_LIMITS.get(key, DEFAULT_LIMIT)
+        self.remaining: Optional[int] = None
+        self.updated = 0.0
+        self.cooldown_until = 0.0
+        self.strikes = 0
+        self.requests = 0
+        self.throttled = 0
+
+    def budget(self, now: float) -> int:
+        """Requests we expect this key can still make; an unseen or stale reading counts as a full window."""
+        if self.remaining is None or now - self.updated > WINDOW:
+            return self.limit
+        return self.remaining
+
+    def cooling(self, now: float) -> bool:
+        return now < self.cooldown_until
+
+
+class KeyPool:
+    """
+    Tracks `X-RateLimit-Remaining` for every NASA key the cog uses and
+    routes keyless requests to the owner's pool.
+
+    A guild's own key is tried first; otherwise (or when it is cooling down
+    after a 429) the pool key with the most remaining budget wins, with
+    DEMO_KEY as the last resort. Each 429 puts the key on an exponential
+    cooldown; a success clears it.
+    """
+
+    def __init__(self, pool: Iterable[str] = ()):
+        self.pool: List[str] = list(pool)
+        self.states: Dict[str, KeyState] = {}
+
+    def state(self, key: str) -> KeyState:
+        state = self.states.get(key)
+        if state is None:
+            state = self.states[key] = KeyState(key)
+        return state
+
+    def candidates(self, guild_key: Optional[str] = None, allow_demo: bool = True) -> List[str]:
+        """
+        Keys to try for a request, best first. With `allow_demo=False`, DEMO_KEY
+        is never offered and the list is empty when no real key is known.
+        """
+        now = time.time()
+        pool = sorted(
+            (key for key in self.pool if key != guild_key),
+            key=lambda key: (self.state(key).cooling(now), -self.state(key).budget(now)),
+        )
+        keys = ([guild_key] if guild_key else []) + pool
+        if allow_demo and DEMO_KEY not in keys:
+            keys.append(DEMO_KEY)
+        elif not allow_demo:
+            keys = [key for key in keys if key != DEMO_KEY]
+        if not keys:
+            return []
+        ready = [key for key in keys if not self.state(key).cooling(now) and self.state(key).budget(now) > 0]
+        if ready:
+            return ready
+        # Everything is throttled: try whichever key frees up first
+        return [min(keys, key=lambda key: self.state(key).cooldown_until)]
+
+    def record(self, key: str, status: int, headers=None) -> None:
+        state = self.state(key)
+        now = time.time()
+        state.requests += 1
+        remaining = _header_int(headers, "X-RateLimit-Remaining")
+        limit = _header_int(headers, "X-RateLimit-Limit")
+        if limit is not None:
+            state.limit = limit
+        if remaining is not None:
+            state.remaining = remaining
+            state.updated = now
+        if status == 429:
+            state.throttled += 1
+            state.strikes += 1
+            state.remaining = 0
+            state.updated = now
+            state.cooldown_until = now + min(BACKOFF_BASE * 2 ** (state.strikes - 1), BACKOFF_MAX)
+        elif status == 200:
+            state.strikes = 0
+            state.cooldown_until = 0.0
+
+    def describe(self, key: str) -> str:
+        """One-line health summary for a key."""
+        state = self.state(key)
+        now = time.time()
+        if state.cooling(now):
+            health = f"throttled, retry in {int(state.cooldown_until - now)}s"
+        elif state.remaining is None or now - state.updated > WINDOW:
+            health = f"~{state.limit}/h (not used this hour)"
+        else:
+            health = f"{state.remaining}/{state.limit} left this hour"
+        return f"{mask(key)}: {health}, {state.requests} requests, {state.throttled} × 429"
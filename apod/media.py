@@ -0,0 +1,255 @@
+import asyncio
+import contextlib
+import hashlib
+import io
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import aiohttp
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional, without it oversized images are linked instead of attached
+    Image = None
+
+log = logging.getLogger("red.didi.apod")
+
+CHUNK_SIZE = 256 * 1024
+IMAGE_EXTENSIONS = {"image/jpeg": ".jpg", "image/png": ".png", "image/gif": ".gif", "image/webp": ".webp"}
+INDEX_FILE = "urls.json"
+# Files still being written; eviction must leave them alone
+PARTIAL_SUFFIXES = (".part", ".tmp")
+
+
+def _shrink(source: Path, target: Path, limit: int) -> bool:
+    """Write a JPEG of `source` no larger than `limit` bytes to `target`. Blocking, run in an executor."""
+    with Image.open(source) as image:
+        image = image.convert("RGB")
+        image.thumbnail((4096, 4096))
+        for _ in range(8):
+            for quality in (90, 80, 70):
+                out = io.BytesIO()
+                image.save(out, format="JPEG", quality=quality, optimize=True)
+                if out.tell() <= limit:
+                    tmp = target.with_suffix(".tmp")
+                    tmp.write_bytes(out.getvalue())
+                    os.replace(tmp, target)
+                    return True
+            image.thumbnail((image.width * 3 // 4, image.height * 3 // 4))
+    return False
+
+
+def _evict(path: Path, max_bytes: int, keep: set) -> None:
+    """Delete least recently used media until the directory fits in `max_bytes`. Blocking."""
+    files = [
+        entry
+        for entry in path.iterdir()
+        if entry.is_file() and entry.name != INDEX_FILE and not entry.name.endswith(PARTIAL_SUFFIXES)
+    ]
+    stats = {entry: entry.stat() for entry in files}
+    total = sum(stat.st_size for stat in stats.values())
+    for entry in sorted(files, key=lambda e: stats[e].st_mtime):
+        if total <= max_bytes:
+            break
+        if entry.name in keep:
+            continue
+        try:
+            entry.unlink()
+            total -= stats[entry].st_size
+        except OSError:
+            pass
+
+
+def _touch(path: Path) -> bool:
+    try:
+        os.utime(path)
+        return True
+    except OSError:
+        return False
+
+
+class MediaHold:
+    """Files an in-progress post will still send; eviction skips them until the hold is released."""
+
+    def __init__(self, pins: Dict[str, int]):
+        self._pins = pins
+        self.names: List[str] = []
+
+    def add(self, name: str) -> None:
+        self._pins[name] = self._pins.get(name, 0) + 1
+        self.names.append(name)
+
+    def release(self) -> None:
+        for name in self.names:
+            count = self._pins.get(name, 0) - 1
+            if count > 0:
+                self._pins[name] = count
+            else:
+                self._pins.pop(name, None)
+        self.names.clear()
+
+
+class MediaCache:
+    """
+    Content-addressed on-disk cache of APOD images for attaching to posts.
+
+    Images are streamed to disk in chunks (never held whole in memory),
+    hashed on the way and stored as `<sha256><ext>`, with a small URL index
+    so the same picture is downloaded once no matter how many guilds post
+    it. Variants that fit a guild's upload limit are made in a worker thread
+    and cached as `<sha256>-<limit>.jpg`. Least recently used files are
+    removed once the directory exceeds `max_bytes`, except those held by a
+    post that is still going out (see `hold`).
+    """
+
+    def __init__(self, path: Path, max_bytes: int = 512 * 1024 * 1024, max_download: int = 64 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_download = max_download
+        self._urls: Dict[str, str] = {}
+        self._flights: Dict[str, asyncio.Task] = {}
+        self._pins: Dict[str, int] = {}
+        path.mkdir(parents=True, exist_ok=True)
+
+    async def load(self) -> None:
+        def _read():
+            try:
+                with open(self.path / INDEX_FILE, encoding="utf-8") as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                return {}
+
+        urls = await asyncio.get_running_loop().run_in_executor(None, _read)
+        if isinstance(urls, dict):
+            self._urls.update(urls)
+
+    @contextlib.contextmanager
+    def hold(self) -> Iterator[MediaHold]:
+        """Keep every file handed out with this hold from being evicted until the block exits."""
+        media_hold = MediaHold(self._pins)
+        try:
+            yield media_hold
+        finally:
+            media_hold.release()
+
+    def _keep(self, *names: str) -> set:
+        return set(self._pins).union(names)
+
+    async def _save_index(self) -> None:
+        def _write(urls):
+            tmp = self.path / (INDEX_FILE + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(urls, f)
+            os.replace(tmp, self.path / INDEX_FILE)
+
+        await asyncio.get_running_loop().run_in_executor(None, _write, dict(self._urls))
+
+    async def _shared(self, key: str, factory) -> Optional[Path]:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = asyncio.ensure_future(factory())
+            flight.add_done_callback(lambda _task: self._flights.pop(key, None))
+        return await asyncio.shield(flight)
+
+    async def original(
+        self, session: aiohttp.ClientSession, url: str, media_hold: Optional[MediaHold] = None
+    ) -> Optional[Path]:
+        """The cached original for `url`, downloading it once if needed."""
+        name = self._urls.get(url)
+        loop = asyncio.get_running_loop()
+        if name is not None:
+            if media_hold is not None:
+                media_hold.add(name)
+            if await loop.run_in_executor(None, _touch, self.path / name):
+                return self.path / name
+        path = await self._shared(url, lambda: self._download(session, url))
+        if path is not None and media_hold is not None:
+            media_hold.add(path.name)
+        return path
+
+    async def _download(self, session: aiohttp.ClientSession, url: str) -> Optional[Path]:
+        loop = asyncio.get_running_loop()
+        tmp = self.path / f"download-{hashlib.sha256(url.encode()).hexdigest()[:16]}.part"
+        hasher = hashlib.sha256()
+        received = 0
+        try:
+            timeout = aiohttp.ClientTimeout(total=300, sock_read=30)
+            async with session.get(url, timeout=timeout) as resp:
+                if resp.status != 200:
+                    log.warning("APOD image download failed with status %s: %s", resp.status, url)
+                    return None
+                ext = IMAGE_EXTENSIONS.get((resp.content_type or "").lower())
+                if ext is None:
+                    return None
+                if resp.content_length and resp.content_length > self.max_download:
+                    return None
+                handle = await loop.run_in_executor(None, open, tmp, "wb")
+                try:
+                    async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                        received += len(chunk)
+                        if received > self.max_download:
+                            log.warning("APOD image over %s bytes, not attaching: %s", self.max_download, url)
+                            return None
+                        hasher.update(chunk)
+                        await loop.run_in_executor(None, handle.write, chunk)
+                finally:
+                    await loop.run_in_executor(None, handle.close)
+            name = hasher.hexdigest() + ext
+            await loop.run_in_executor(None, os.replace, tmp, self.path / name)
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            log.warning("Could not download APOD image %s: %r", url, e)
+            return None
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+
+        self._urls[url] = name
+        try:
+            await self._save_index()
+            await loop.run_in_executor(None, _evict, self.path, self.max_bytes, self._keep(name))
+        except OSError:
+            log.exception("Could not update the APOD media cache index")
+        return self.path / name
+
+    async def for_upload(
+        self, session: aiohttp.ClientSession, url: str, limit: int, media_hold: Optional[MediaHold] = None
+    ) -> Optional[Path]:
+        """
+        A cached file for `url` no larger than `limit` bytes, or None if that isn't possible.
+        Pass a `media_hold` when the file is sent later, so eviction can't remove it meanwhile.
+        """
+        original = await self.original(session, url, media_hold)
+        if original is None:
+            return None
+        loop = asyncio.get_running_loop()
+        size = await loop.run_in_executor(None, lambda: original.stat().st_size)
+        if size <= limit:
+            return original
+        if Image is None:
+            return None
+        variant = self.path / f"{original.stem}-{limit}.jpg"
+        if media_hold is not None:
+            media_hold.add(variant.name)
+        if await loop.run_in_executor(None, _touch, variant):
+            return variant
+
+        async def make() -> Optional[Path]:
+            try:
+                made = await loop.run_in_executor(None, _shrink, original, variant, limit)
+            except Exception:
+                log.exception("Could not resize APOD image %s", original.name)
+                return None
+            if not made:
+                return None
+            try:
+                await loop.run_in_executor(
+                    None, _evict, self.path, self.max_bytes, self._keep(original.name, variant.name)
+                )
+            except OSError:
+                log.exception("Could not evict APOD media")
+            return variant
+
+        return await self._shared(variant.name, make)
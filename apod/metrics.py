@@ -0,0 +1,111 @@
+import bisect
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Upper bounds in seconds; the last bucket catches everything above
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LAG_BUCKETS = (0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+
+class Histogram:
+    """Fixed-bucket histogram; memory stays constant however many values are observed."""
+
+    __slots__ = ("bounds", "counts", "count", "total", "max")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the `q` quantile (the observed max for the overflow bucket)."""
+        if not self.count:
+            return 0.0
+        rank = max(1, round(q * self.count))
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def __str__(self) -> str:
+        if not self.count:
+            return "no data"
+        return (
+            f"n={self.count} mean={self.mean:.2f}s p50≤{self.quantile(0.5):.2f}s "
+            f"p95≤{self.quantile(0.95):.2f}s max={self.max:.2f}s"
+        )
+
+
+class ApodMetrics:
+    """
+    Counters and latency histograms for fetching and posting, since the cog was loaded.
+
+    Counter names are free-form; failures are kept per reason as
+    `<kind>:<reason>` so new reasons need no registration.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.counters: Dict[str, int] = {}
+        self.upstream_latency = Histogram(LATENCY_BUCKETS)
+        self.slot_start_lag = Histogram(LAG_BUCKETS)
+        self.post_lag = Histogram(LAG_BUCKETS)
+        self.manual_post_latency = Histogram(LATENCY_BUCKETS)
+        self.last_schedule_pass: Optional[float] = None
+
+    def incr(self, name: str, amount: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def fail(self, kind: str, reason: str, amount: int = 1) -> None:
+        self.incr(f"{kind}:{reason}", amount)
+
+    def get(self, name: str) -> int:
+        return self.counters.get(name, 0)
+
+    def failures(self, kind: str) -> Dict[str, int]:
+        prefix = kind + ":"
+        return {name[len(prefix):]: n for name, n in self.counters.items() if name.startswith(prefix)}
+
+    @property
+    def cache_hit_rate(self) -> Optional[float]:
+        lookups = self.get("cache_hits") + self.get("cache_misses")
+        return self.get("cache_hits") / lookups if lookups else None
+
+    def lines(self) -> List[str]:
+        def reasons(kind: str) -> str:
+            found = self.failures(kind)
+            return ", ".join(f"{reason}: {n}" for reason, n in sorted(found.items())) or "none"
+
+        hit_rate = self.cache_hit_rate
+        uptime = int(time.time() - self.started)
+        lines = [
+            f"Since load ({uptime // 3600}h {uptime % 3600 // 60}m ago)",
+            f"Fetches: {self.get('cache_hits') + self.get('cache_misses')}, cache hit rate "
+            + (f"{hit_rate:.1%}" if hit_rate is not None else "n/a"),
+            f"Upstream calls: {self.get('upstream_requests')}, failures: {reasons('upstream')}",
+            f"Upstream latency: {self.upstream_latency}",
+            f"Slots fired: {self.get('slots')}, catch-up passes: {self.get('catch_up_passes')}",
+            f"Slot start lag: {self.slot_start_lag}",
+            f"Scheduled posts: {self.get('posts_sent')} sent, {self.get('posts_skipped')} skipped, "
+            f"{self.get('posts_duplicate')} already posted, failures: {reasons('post')}",
+            f"Image/link follow-ups failed after the embed: {reasons('post_followup')}",
+            f"Post lag vs scheduled time: {self.post_lag}",
+            f"Manual posts: {self.get('manual_posts')}, latency: {self.manual_post_latency}",
+        ]
+        if self.last_schedule_pass is not None:
+            lines.append(f"Last scheduling pass: {self.last_schedule_pass * 1000:.0f}ms")
+        return lines
@@ -0,0 +1,130 @@
+import asyncio
+import datetime
+import heapq
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+log = logging.getLogger("red.didi.apod")
+
+# The loop re-checks the clock at least this often, so suspend/clock jumps can't delay posts for long
+MAX_SLEEP = 300.0
+
+# (post_time, guild_ids, scheduled fire time in epoch seconds)
+SlotCallback = Callable[[str, List[int], float], Awaitable[None]]
+
+
+def next_fire_time(post_time: str, now: Optional[float] = None) -> float:
+    """Epoch seconds of the next `HH:MM` (UTC) after `now`."""
+    parsed = datetime.datetime.strptime(post_time, "%H:%M")
+    current = datetime.datetime.fromtimestamp(time.time() if now is None else now, datetime.timezone.utc)
+    target = current.replace(hour=parsed.hour, minute=parsed.minute, second=0, microsecond=0)
+    if target <= current:
+        target += datetime.timedelta(days=1)
+    return target.timestamp()
+
+
+class SlotScheduler:
+    """
+    One task that fires every guild's daily post.
+
+    Guilds sit in a min-heap of `(next_fire_time, guild_id)`. When the
+    earliest entry is due, every due guild is popped, grouped by its
+    `post_time` slot and handed to `callback(post_time, guild_ids, fire_time)`
+    once per slot, then pushed back for the next day. Rescheduling a guild just
+    records its new slot; the old heap entry is skipped when it surfaces.
+    """
+
+    def __init__(self, callback: SlotCallback):
+        self.callback = callback
+        self._heap: List[Tuple[float, int]] = []
+        self._slots: Dict[int, Tuple[float, str]] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, guild_id: int) -> bool:
+        return guild_id in self._slots
+
+    def guild_ids(self) -> List[int]:
+        return list(self._slots)
+
+    def post_time(self, guild_id: int) -> Optional[str]:
+        slot = self._slots.get(guild_id)
+        return slot[1] if slot else None
+
+    def next_fire(self) -> Optional[float]:
+        return min((fire for fire, _post_time in self._slots.values()), default=None)
+
+    def schedule(self, guild_id: int, post_time: str) -> None:
+        """Add or re-key a guild. Raises ValueError for a malformed `post_time`."""
+        current = self._slots.get(guild_id)
+        if current is not None and current[1] == post_time:
+            return
+        fire = next_fire_time(post_time)
+        self._slots[guild_id] = (fire, post_time)
+        heapq.heappush(self._heap, (fire, guild_id))
+        if len(self._heap) > 2 * len(self._slots) + 64:
+            self._compact()
+        if self._heap[0] == (fire, guild_id):
+            self._wakeup.set()
+
+    def unschedule(self, guild_id: int) -> None:
+        self._slots.pop(guild_id, None)
+
+    def _compact(self) -> None:
+        self._heap = [(fire, guild_id) for guild_id, (fire, _post_time) in self._slots.items()]
+        heapq.heapify(self._heap)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="apod-scheduler")
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for task in self._running:
+            task.cancel()
+        self._running.clear()
+
+    def _pop_due(self, now: float) -> Dict[str, Tuple[float, List[int]]]:
+        due: Dict[str, Tuple[float, List[int]]] = {}
+        while self._heap and self._heap[0][0] <= now:
+            fire, guild_id = heapq.heappop(self._heap)
+            slot = self._slots.get(guild_id)
+            if slot is None or slot[0] != fire:
+                continue  # unscheduled or re-keyed since this entry was pushed
+            post_time = slot[1]
+            earliest, guild_ids = due.get(post_time, (fire, []))
+            guild_ids.append(guild_id)
+            due[post_time] = (min(earliest, fire), guild_ids)
+            following = next_fire_time(post_time, now)
+            self._slots[guild_id] = (following, post_time)
+            heapq.heappush(self._heap, (following, guild_id))
+        return due
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            for post_time, (fire, guild_ids) in self._pop_due(now).items():
+                task = asyncio.create_task(self._fire(post_time, guild_ids, fire), name=f"apod-slot-{post_time}")
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+            delay = self._heap[0][0] - now if self._heap else MAX_SLEEP
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.0, min(delay, MAX_SLEEP)))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, post_time: str, guild_ids: List[int], fire: float) -> None:
+        try:
+            await self.callback(post_time, guild_ids, fire)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception("APOD slot %s failed for %s guild(s)", post_time, len(guild_ids))
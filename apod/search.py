@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import re
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, Optional, Set, Tuple
+
+log = logging.getLogger("red.didi.apod")
+
+TERM_RE = re.compile(r"\w+\*?", re.UNICODE)
+
+# (date, title, snippet)
+SearchHit = Tuple[str, str, str]
+
+
+def _rowid(date: str) -> int:
+    return int(date.replace("-", ""))
+
+
+def build_query(terms: str) -> Optional[str]:
+    """Turn free text into an FTS5 query matching every word; a trailing `*` keeps prefix matching."""
+    words = TERM_RE.findall(terms)
+    if not words:
+        return None
+    return " ".join(f'"{w.rstrip("*")}"*' if w.endswith("*") else f'"{w}"' for w in words)
+
+
+class SearchIndex:
+    """
+    SQLite FTS5 index over APOD titles and explanations, stored next to the cache.
+
+    One row per date (the rowid is the date as YYYYMMDD, so re-adding a day
+    replaces it). All database work runs on a single worker thread, which
+    serialises access without blocking the event loop. If the SQLite build
+    lacks FTS5 the index reports itself unavailable instead of failing.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.available = False
+        self._db: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="apod-search")
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _open(self) -> None:
+        db = sqlite3.connect(str(self.path), check_same_thread=False)
+        try:
+            db.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS apod USING fts5("
+                "date UNINDEXED, title, explanation, tokenize='porter unicode61')"
+            )
+        except sqlite3.OperationalError:
+            db.close()
+            log.warning("SQLite was built without FTS5, [p]apod search is unavailable")
+            return
+        db.commit()
+        self._db = db
+        self.available = True
+
+    async def open(self) -> None:
+        await self._run(self._open)
+
+    def close(self) -> None:
+        def _close():
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+        self.available = False
+        self._executor.submit(_close)
+        self._executor.shutdown(wait=False)
+
+    def _add_many(self, rows: List[Tuple[int, str, str, str]]) -> None:
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO apod(rowid, date, title, explanation) VALUES (?, ?, ?, ?)", rows
+            )
+
+    async def add_many(self, entries: Iterable[Tuple[str, dict]]) -> None:
+        if not self.available:
+            return
+        rows = [
+            (_rowid(date), date, payload.get("title") or "", payload.get("explanation") or "")
+            for date, payload in entries
+        ]
+        if rows:
+            await self._run(self._add_many, rows)
+
+    async def add(self, date: str, payload: dict) -> None:
+        await self.add_many([(date, payload)])
+
+    def _dates(self) -> Set[str]:
+        return {row[0] for row in self._db.execute("SELECT date FROM apod")}
+
+    async def indexed_dates(self) -> Set[str]:
+        if not self.available:
+            return set()
+        return await self._run(self._dates)
+
+    def _search(self, query: str, limit: int, offset: int) -> Tuple[int, List[SearchHit]]:
+        total = self._db.execute("SELECT count(*) FROM apod WHERE apod MATCH ?", (query,)).fetchone()[0]
+        rows = self._db.execute(
+            "SELECT date, title, snippet(apod, 2, '**', '**', '…', 16) FROM apod WHERE apod MATCH ? "
+            "ORDER BY bm25(apod, 0.0, 10.0, 1.0) LIMIT ? OFFSET ?",
+            (query, limit, offset),
+        ).fetchall()
+        return total, rows
+
+    async def search(self, terms: str, limit: int = 50, offset: int = 0) -> Tuple[int, List[SearchHit]]:
+        """Total number of matches and the best `limit` of them after `offset`, best first."""
+        query = build_query(terms)
+        if not self.available or query is None:
+            return 0, []
+        try:
+            return await self._run(self._search, query, limit, offset)
+        except sqlite3.OperationalError:
+            log.debug("Rejected APOD search query %r", query, exc_info=True)
+            return 0, []
@@ -0,0 +1,57 @@
+"""Helpers shared by the load tests: Red's data directory, mock server startup, memory."""
+import asyncio
+import os
+import resource
+import socket
+import sys
+import tempfile
+import time
+from typing import Iterable, List
+
+
+def use_temp_data_dir(prefix: str) -> str:
+    """Point Red's data manager at a throwaway directory; call before importing a cog, whose Config needs it."""
+    from redbot.core import data_manager
+
+    path = tempfile.mkdtemp(prefix=prefix)
+    data_manager.basic_config = dict(data_manager.basic_config_default)
+    data_manager.basic_config["DATA_PATH"] = path
+    data_manager.basic_config["STORAGE_TYPE"] = "JSON"
+    data_manager.basic_config["STORAGE_DETAILS"] = {}
+    return path
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Peak rather than current, but still shows growth
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def wait_for_port(port: int, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"mock server did not start on port {port}")
+            await asyncio.sleep(0.1)
+
+
+def mock_argv(module: str, port: int, args, options: Iterable[str]) -> List[str]:
+    """Command line running mock server `module` on `port`, passing on each of `options` from `args`."""
+    argv = [sys.executable, "-m", module, "--port", str(port)]
+    for option in options:
+        argv += ["--" + option.replace("_", "-"), str(getattr(args, option))]
+    return argv
@@ -0,0 +1,226 @@
+"""
+Scheduled-post load test of the APOD cog against a local NASA stand-in.
+
+Starts `benchmarks.mock_apod` in a subprocess (or in-process with
+`--in-process`), loads the cog with a throwaway Red data directory and
+thousands of fake guilds spread over a handful of post times, then lets the
+real slot scheduler fire every slot a few seconds apart instead of at the
+configured wall-clock times. Fake channels simulate Discord send latency and
+transient failures. Reports the scheduling pass, each slot's delivery report,
+the cog's `[p]apodset stats` output (slot start and post lag against the
+scheduled time, cache hit rate, upstream calls) and what the mock saw.
+
+Run from the repository root (Red-DiscordBot must be installed):
+
+    python -m benchmarks.apod_load --guilds 5000 --slots 4 --spacing 10 --fanout-rate 200 --send-latency 80
+"""
+import argparse
+import asyncio
+import random
+import subprocess
+import time
+
+import aiohttp
+import discord
+from redbot.core import Config
+
+from benchmarks import mock_apod
+from benchmarks._harness import free_port, mock_argv, rss_bytes, use_temp_data_dir, wait_for_port
+
+# Red's data manager must point somewhere before the cog's Config is created
+use_temp_data_dir("apod-load-")
+
+import apod.apod as apod_module  # noqa: E402
+import apod.scheduler as scheduler_module  # noqa: E402
+from apod.apod import APOD  # noqa: E402
+
+MOCK_OPTIONS = ("latency", "jitter", "error_rate", "key_limit", "demo_limit", "image_kib")
+
+
+class _Permissions:
+    send_messages = embed_links = attach_files = True
+
+
+class FakeGuild:
+    filesize_limit = 25 * 1024 * 1024
+
+    def __init__(self, guild_id: int, channel_factory):
+        self.id = guild_id
+        self.me = object()
+        self.channel = channel_factory(self)
+
+    def get_channel(self, channel_id):
+        return self.channel if channel_id == self.channel.id else None
+
+    def get_role(self, role_id):
+        return None
+
+
+def channel_class(latency: float, error_rate: float, rng: random.Random, sent: list):
+    class FakeChannel(discord.TextChannel):
+        # A TextChannel subclass so the cog's isinstance checks pass; no real state is set up
+        def __init__(self, guild: FakeGuild):
+            self.id = guild.id * 10
+            self._fake_guild = guild
+
+        @property
+        def guild(self):
+            return self._fake_guild
+
+        def permissions_for(self, member):
+            return _Permissions()
+
+        async def send(self, **kwargs):
+            await asyncio.sleep(max(0.0, rng.gauss(latency, latency / 4)))
+            if error_rate and rng.random() < error_rate:
+                raise aiohttp.ClientOSError("simulated Discord connection reset")
+            sent.append(time.time())
+
+    return FakeChannel
+
+
+class FakeBot:
+    def __init__(self, guilds):
+        self.guilds = guilds
+        self._by_id = {guild.id: guild for guild in guilds}
+
+    def get_guild(self, guild_id):
+        return self._by_id.get(guild_id)
+
+    async def get_embed_color(self, channel):
+        return discord.Color.blue()
+
+    async def wait_until_red_ready(self):
+        return
+
+
+def compressed_clock(fire_at):
+    """A `next_fire_time` that fires each post time once at `fire_at[post_time]`, then a day later."""
+
+    def next_fire_time(post_time, now=None):
+        if now is None:
+            return fire_at[post_time]
+        return now + 86400
+
+    return next_fire_time
+
+
+async def run(args):
+    port = free_port()
+    process = server = None
+    if args.in_process:
+        server = mock_apod.from_arguments(args)
+        base = await server.start("127.0.0.1", port)
+    else:
+        argv = mock_argv("benchmarks.mock_apod", port, args, MOCK_OPTIONS)
+        process = subprocess.Popen(argv, stdout=subprocess.DEVNULL)
+        base = f"http://127.0.0.1:{port}"
+    await wait_for_port(port)
+    apod_module.APOD_URL = f"{base}/planetary/apod"
+
+    rng = random.Random(args.seed)
+    sent = []
+    FakeChannel = channel_class(args.send_latency / 1000, args.send_error_rate, rng, sent)
+    guilds = [FakeGuild(1000 + i, FakeChannel) for i in range(args.guilds)]
+    post_times = [f"{9 + i // 4:02d}:{i % 4 * 15:02d}" for i in range(args.slots)]
+    start = time.time() + args.lead
+    fire_at = {post_time: start + i * args.spacing for i, post_time in enumerate(post_times)}
+    scheduler_module.next_fire_time = compressed_clock(fire_at)
+
+    cog = APOD(FakeBot(guilds))
+    # One bulk write; setting thousands of guilds one by one rewrites the JSON file each time
+    await cog.config._get_base_group(Config.GUILD).set(
+        {
+            str(guild.id): {
+                "channel_id": guild.channel.id,
+                "post_time": post_times[i % len(post_times)],
+                "attach_image": args.attach,
+                "api_key": "guild-key" if i < args.keyed else None,
+            }
+            for i, guild in enumerate(guilds)
+        }
+    )
+    await cog.config.key_pool.set([f"pool-key-{i}" for i in range(args.keys)])
+    await cog.config.fanout_concurrency.set(args.fanout_concurrency)
+    await cog.config.fanout_rate.set(args.fanout_rate)
+
+    rss_start = rss_bytes()
+    await cog.cog_load()
+    await cog._schedule_task
+    print(
+        f"scheduled {len(cog.scheduler)} guilds over {len(post_times)} slots "
+        f"in {cog.metrics.last_schedule_pass * 1000:.0f}ms"
+    )
+
+    deadline = fire_at[post_times[-1]] + args.drain
+    while time.time() < deadline:
+        if len(cog.reports) >= len(post_times) and not cog.scheduler._running:
+            break
+        await asyncio.sleep(0.2)
+    elapsed = time.time() - start
+    rss_end = rss_bytes()
+
+    server_stats = None
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"{base}/stats") as resp:
+                server_stats = await resp.json()
+    except aiohttp.ClientError:
+        pass
+
+    cog.cog_unload()
+    await asyncio.sleep(0.1)
+    if server is not None:
+        await server.stop()
+    if process is not None:
+        process.terminate()
+        process.wait()
+
+    report(args, cog, sent, elapsed, rss_start, rss_end, server_stats)
+
+
+def report(args, cog, sent, elapsed, rss_start, rss_end, server_stats):
+    print(
+        f"{args.guilds} guilds, {args.slots} slots {args.spacing:.0f}s apart, fan-out "
+        f"{args.fanout_concurrency} channels / {args.fanout_rate:g} msg/s, Discord send ~{args.send_latency:.0f}ms"
+    )
+    for slot_report in cog.reports:
+        print(f"  {slot_report}")
+    print(f"messages sent: {len(sent)} over {elapsed:.1f}s")
+    for line in cog.metrics.lines():
+        print(line)
+    print(
+        f"memory: RSS {rss_start / 2**20:.1f} MiB -> {rss_end / 2**20:.1f} MiB "
+        f"({(rss_end - rss_start) / 2**20:+.1f} MiB)"
+    )
+    if server_stats:
+        keys = ", ".join(f"{key}: {count}" for key, count in sorted(server_stats["by_key"].items()))
+        print(
+            f"mock server: {server_stats['requests']} APOD requests ({keys or 'none'}), "
+            f"{server_stats['throttled']} throttled (429), {server_stats['errors']} failed, "
+            f"{server_stats['images']} image downloads, peak {server_stats['peak_in_flight']} in flight"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--guilds", type=int, default=2000)
+    parser.add_argument("--slots", type=int, default=4, help="distinct post times shared by the guilds")
+    parser.add_argument("--spacing", type=float, default=5, help="seconds between slots")
+    parser.add_argument("--lead", type=float, default=2, help="seconds from startup to the first slot")
+    parser.add_argument("--drain", type=float, default=120, help="seconds to wait for the last slot to finish")
+    parser.add_argument("--keyed", type=int, default=0, help="guilds with their own NASA key")
+    parser.add_argument("--keys", type=int, default=2, help="keys in the owner's shared pool")
+    parser.add_argument("--attach", action="store_true", help="attach images instead of linking them")
+    parser.add_argument("--fanout-concurrency", type=int, default=50)
+    parser.add_argument("--fanout-rate", type=float, default=200, help="messages per second (0 = unpaced)")
+    parser.add_argument("--send-latency", type=float, default=80, help="simulated Discord send latency in ms")
+    parser.add_argument("--send-error-rate", type=float, default=0.0, help="fraction of sends that fail transiently")
+    parser.add_argument("--in-process", action="store_true", help="run the mock server in this event loop")
+    mock_apod.add_arguments(parser)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Compare Gemini request payload sizes: full channel history vs. BM25 relevance retrieval.
+
+Builds synthetic channel transcripts where several topics are interleaved,
+then for each question measures the JSON payload the cog would send with
+today's full-history behaviour and with `[p]gemini retrieval <k>`, plus how
+often the earlier turns about the same topic made it into the retrieved context.
+
+Run from the repository root (Red-DiscordBot must be installed):
+
+    python -m benchmarks.gemini_history_payload --turns 50 200 1000 --k 8
+"""
+import argparse
+import datetime
+import json
+import random
+import statistics
+
+from gemini.gemini import RETRIEVAL_RECENT_TURNS, build_contents
+from gemini.retrieval import HistoryRetriever
+
+TOPICS = {
+    "astronomy": ["telescope", "nebula", "galaxy", "orbit", "comet", "eclipse", "redshift", "exoplanet"],
+    "cooking": ["recipe", "oven", "garlic", "sourdough", "simmer", "spice", "pasta", "marinade"],
+    "python": ["asyncio", "decorator", "generator", "typing", "pytest", "coroutine", "dataclass", "import"],
+    "music": ["chord", "guitar", "tempo", "melody", "synth", "drummer", "harmony", "vinyl"],
+    "gaming": ["speedrun", "controller", "raid", "respawn", "quest", "loot", "boss", "multiplayer"],
+    "gardening": ["compost", "seedling", "tomato", "pruning", "mulch", "soil", "greenhouse", "watering"],
+}
+FILLER = "could you explain a bit more about how that works and why it matters in practice".split()
+
+
+def make_turn(rng: random.Random, topic: str, words: int) -> str:
+    keywords = rng.sample(TOPICS[topic], 3)
+    filler = rng.choices(FILLER, k=words)
+    return " ".join(keywords + filler)
+
+
+def make_history(rng: random.Random, turns: int):
+    start = datetime.datetime(2025, 1, 1)
+    history, topics = [], []
+    for i in range(turns // 2):
+        topic = rng.choice(list(TOPICS))
+        topics.append(topic)
+        when = start + datetime.timedelta(minutes=i)
+        history.append({"role": "user", "content": make_turn(rng, topic, 12), "time": when.isoformat()})
+        history.append({
+            "role": "assistant",
+            "content": make_turn(rng, topic, 60),
+            "time": (when + datetime.timedelta(seconds=5)).isoformat(),
+        })
+    return history, topics
+
+
+def payload_bytes(history, query, system_prompt):
+    contents = build_contents(history + [{"role": "user", "content": query}])
+    payload = {"contents": contents, "system_instruction": {"parts": [{"text": system_prompt}]}}
+    return len(json.dumps(payload).encode("utf-8"))
+
+
+def run(turns: int, k: int, queries: int, seed: int):
+    rng = random.Random(seed)
+    history, topics = make_history(rng, turns)
+    system_prompt = "You are an instance of Red-DiscordBot running in discord. You are friendly."
+    retriever = HistoryRetriever()
+    full_sizes, retrieved_sizes, hits = [], [], []
+
+    for _ in range(queries):
+        topic = rng.choice(list(TOPICS))
+        query = make_turn(rng, topic, 8)
+        context = retriever.select(1, history, query, k, RETRIEVAL_RECENT_TURNS)
+        full_sizes.append(payload_bytes(history, query, system_prompt))
+        retrieved_sizes.append(payload_bytes(context, query, system_prompt))
+
+        older = history[:-RETRIEVAL_RECENT_TURNS]
+        recent_ids = {id(entry) for entry in history[-RETRIEVAL_RECENT_TURNS:]}
+        picked = [entry for entry in context if id(entry) not in recent_ids and entry["role"] == "user"]
+        if older and picked:
+            on_topic = sum(1 for entry in picked if topics[history.index(entry) // 2] == topic)
+            hits.append(on_topic / len(picked))
+
+    full = statistics.mean(full_sizes)
+    retrieved = statistics.mean(retrieved_sizes)
+    precision = statistics.mean(hits) if hits else 1.0
+    return full, retrieved, precision
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, nargs="+", default=[20, 100, 500, 2000])
+    parser.add_argument("--k", type=int, default=8, help="relevant older turns to retrieve")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=129)
+    args = parser.parse_args()
+
+    print(f"k={args.k}, recent={RETRIEVAL_RECENT_TURNS}, {args.queries} queries per row")
+    print(f"{'turns':>7} {'full (B)':>12} {'retrieval (B)':>14} {'saved':>7} {'on-topic':>9}")
+    for turns in args.turns:
+        full, retrieved, precision = run(turns, args.k, args.queries, args.seed)
+        saved = 1 - retrieved / full
+        print(f"{turns:>7} {full:>12.0f} {retrieved:>14.0f} {saved:>7.0%} {precision:>9.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+End-to-end load test of the Gemini cog against a local mock API.
+
+Starts `benchmarks.mock_gemini` in a subprocess (or in-process with
+`--in-process`), loads the cog with a throwaway Red data directory, and feeds
+fake Discord messages from always-respond channels into
+`gemini_message_handler` at a fixed rate. Reports answered/busy/failed
+counts, throughput, end-to-end latency percentiles, open sockets and
+resident memory growth, plus what the mock server saw.
+
+Run from the repository root (Red-DiscordBot must be installed):
+
+    python -m benchmarks.gemini_load --rate 50 --duration 30 --guilds 20 --latency 300 --burst-every 10 --burst-length 1
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import time
+
+import aiohttp
+
+from benchmarks import mock_gemini
+from benchmarks._harness import free_port, mock_argv, rss_bytes, use_temp_data_dir, wait_for_port
+
+# Red's data manager must point somewhere before the cog's Config is created
+use_temp_data_dir("gemini-load-")
+
+from gemini.gemini import BUSY_MESSAGE, Gemini  # noqa: E402
+from gemini.metrics import percentile  # noqa: E402
+
+MOCK_OPTIONS = ("latency", "jitter", "error_rate", "burst_every", "burst_length", "response_words")
+
+
+class FakeUser:
+    def __init__(self, user_id: int, bot: bool = False):
+        self.id = user_id
+        self.bot = bot
+        self.display_name = self.name = f"user{user_id}"
+        self.mention = f"<@{user_id}>"
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+
+
+class _Typing:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int, guild: FakeGuild):
+        self.id = channel_id
+        self.guild = guild
+
+    def typing(self):
+        return _Typing()
+
+
+class FakeMessage:
+    def __init__(self, message_id, channel, author, content, results):
+        self.id = message_id
+        self.guild = channel.guild
+        self.channel = channel
+        self.author = author
+        self.content = self.clean_content = content
+        self.attachments = []
+        self.reference = None
+        self.created = time.perf_counter()
+        self._results = results
+
+    async def reply(self, text, **kwargs):
+        self._results.append((time.perf_counter() - self.created, outcome(text)))
+        return self
+
+
+class FakeBot:
+    def __init__(self):
+        self.user = FakeUser(1, bot=True)
+        self.cached_messages = []
+
+
+def outcome(text: str) -> str:
+    if text == BUSY_MESSAGE:
+        return "busy"
+    if text.startswith("🐢"):
+        return "quota"
+    if text[:1] in ("❌", "⚠", "⌛"):
+        return "error"
+    return "ok"
+
+
+def open_sockets():
+    """Sockets held by this process (Linux only), or None where /proc is unavailable."""
+    try:
+        fds = os.listdir("/proc/self/fd")
+    except OSError:
+        return None
+    count = 0
+    for fd in fds:
+        try:
+            if os.readlink(f"/proc/self/fd/{fd}").startswith("socket:"):
+                count += 1
+        except OSError:
+            continue
+    return count
+
+
+async def run(args):
+    port = free_port()
+    process = server = None
+    if args.in_process:
+        server = mock_gemini.from_arguments(args)
+        base = await server.start("127.0.0.1", port)
+    else:
+        argv = mock_argv("benchmarks.mock_gemini", port, args, MOCK_OPTIONS)
+        process = subprocess.Popen(argv, stdout=subprocess.DEVNULL)
+        base = f"http://127.0.0.1:{port}"
+    await wait_for_port(port)
+
+    cog = Gemini(FakeBot())
+    await cog.cog_load()
+    cog.scheduler.configure(global_limit=args.concurrency, guild_limit=args.guild_concurrency)
+    api_url = f"{base}/v1beta/models/mock:generateContent"
+    guilds = [FakeGuild(1000 + i) for i in range(args.guilds)]
+    channels = []
+    for guild in guilds:
+        await cog.settings.set_guild(guild, "api_key", "mock")
+        await cog.settings.set_guild(guild, "api_url", api_url)
+        for c in range(args.channels):
+            channel = FakeChannel(guild.id * 100 + c, guild)
+            await cog.settings.set_channel(channel, "always_respond", True)
+            await cog.settings.set_channel(channel, "use_history", args.history)
+            await cog.settings.set_channel(channel, "session_mode", args.session_mode)
+            await cog.settings.set_channel(channel, "retrieval_k", args.retrieval)
+            channels.append(channel)
+    users = [FakeUser(10_000 + i) for i in range(args.users)]
+
+    results = []
+    tasks = set()
+    samples = []
+    stop = asyncio.Event()
+
+    async def sample():
+        while not stop.is_set():
+            samples.append(open_sockets())
+            try:
+                await asyncio.wait_for(stop.wait(), 0.25)
+            except asyncio.TimeoutError:
+                pass
+
+    rss_start = rss_bytes()
+    sampler = asyncio.create_task(sample())
+    total = int(args.rate * args.duration)
+    started = time.perf_counter()
+    for i in range(total):
+        delay = started + i / args.rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        channel = channels[i % len(channels)]
+        author = users[(i * 7) % len(users)]
+        message = FakeMessage(i + 1, channel, author, f"message {i} about comets and telescopes", results)
+        task = asyncio.create_task(cog.gemini_message_handler(message))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    sent_for = time.perf_counter() - started
+    if tasks:
+        await asyncio.wait(set(tasks), timeout=args.drain)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await sampler
+    rss_end = rss_bytes()
+
+    server_stats = None
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"{base}/stats") as resp:
+                server_stats = await resp.json()
+    except aiohttp.ClientError:
+        pass
+
+    summary = cog.metrics.summarize(by="guild")
+    retries = sum(max(0, r.attempts - 1) for r in cog.metrics.records())
+    await cog.cog_unload()
+    await asyncio.sleep(0.1)
+    if server is not None:
+        await server.stop()
+    if process is not None:
+        process.terminate()
+        process.wait()
+
+    report(args, total, sent_for, elapsed, results, len(tasks), samples, rss_start, rss_end, server_stats, summary, retries)
+
+
+def report(args, total, sent_for, elapsed, results, unfinished, samples, rss_start, rss_end, server_stats, summary, retries):
+    counts = {}
+    for _latency, kind in results:
+        counts[kind] = counts.get(kind, 0) + 1
+    latencies = sorted(latency for latency, kind in results if kind == "ok")
+    print(
+        f"{total} messages at {args.rate}/s over {sent_for:.1f}s "
+        f"({args.guilds} guilds x {args.channels} channels, {args.users} users, "
+        f"concurrency {args.concurrency}/{args.guild_concurrency}, history {'on' if args.history else 'off'})"
+    )
+    print(
+        "replies: " + ", ".join(f"{kind} {count}" for kind, count in sorted(counts.items()))
+        + f", unanswered {total - len(results)} (still running {unfinished})"
+    )
+    print(f"throughput: {counts.get('ok', 0) / elapsed:.1f} answered/s over {elapsed:.1f}s")
+    if latencies:
+        print(
+            "latency (ok): "
+            + " ".join(f"p{p}={percentile(latencies, p) * 1000:.0f}ms" for p in (50, 90, 95, 99))
+            + f" max={latencies[-1] * 1000:.0f}ms"
+        )
+    measured = [s for s in samples if s is not None]
+    if measured:
+        print(f"open sockets: peak {max(measured)}, at end {measured[-1]}")
+    else:
+        print("open sockets: unavailable on this platform")
+    print(
+        f"memory: RSS {rss_start / 2**20:.1f} MiB -> {rss_end / 2**20:.1f} MiB "
+        f"({(rss_end - rss_start) / 2**20:+.1f} MiB)"
+    )
+    requests = sum(s.count for s in summary.values())
+    errors = {}
+    for s in summary.values():
+        for kind, count in s.errors.items():
+            errors[kind] = errors.get(kind, 0) + count
+    print(
+        f"cog: {requests} Gemini requests, {retries} retries"
+        + (", failures: " + ", ".join(f"{kind} {count}" for kind, count in sorted(errors.items())) if errors else "")
+    )
+    if server_stats:
+        print(
+            f"mock server: {server_stats['requests']} requests, {server_stats['throttled']} throttled (429), "
+            f"{server_stats['errors']} failed, peak {server_stats['peak_in_flight']} in flight"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=20, help="messages per second")
+    parser.add_argument("--duration", type=float, default=15, help="seconds to send messages for")
+    parser.add_argument("--drain", type=float, default=60, help="seconds to wait for outstanding replies")
+    parser.add_argument("--guilds", type=int, default=10)
+    parser.add_argument("--channels", type=int, default=2, help="always-respond channels per guild")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8, help="cog-wide concurrent requests")
+    parser.add_argument("--guild-concurrency", type=int, default=2, help="concurrent requests per guild")
+    parser.add_argument("--history", action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument("--session-mode", choices=("channel", "user"), default="channel")
+    parser.add_argument("--retrieval", type=int, default=0, help="relevance retrieval k (0 = full history)")
+    parser.add_argument("--in-process", action="store_true", help="run the mock server in this event loop")
+    mock_gemini.add_arguments(parser)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Local stand-in for NASA's APOD API (`GET /planetary/apod`).
+
+Supports `date`, `start_date`/`end_date` and `count` like the real service,
+and serves a placeholder image for every entry from `/image/<date>.jpg`.
+Each API key gets an hourly request budget reported in
+`X-RateLimit-Limit`/`X-RateLimit-Remaining` and answered with 429 once spent
+(DEMO_KEY gets a smaller one, as on api.nasa.gov). Latency and error rate
+are configurable, and `/stats` reports what the server saw.
+
+Run from the repository root (only aiohttp is needed):
+
+    python -m benchmarks.mock_apod --port 8766 --latency 400 --key-limit 1000
+"""
+import argparse
+import asyncio
+import datetime
+import random
+import time
+
+from aiohttp import web
+
+APOD_START = datetime.date(1995, 6, 16)
+DEMO_KEY = "DEMO_KEY"
+WINDOW = 3600.0
+FILLER = "nebula galaxy comet aurora eclipse cluster supernova telescope horizon dust lanes spiral".split()
+
+
+class MockApod:
+    """
+    aiohttp application that behaves enough like api.nasa.gov for load tests.
+
+    `latency` and `jitter` are in seconds. `key_limit` requests per key are
+    allowed per hour (`demo_limit` for DEMO_KEY); `error_rate` of requests
+    fail with a 500 or 503.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.3,
+        jitter: float = 0.05,
+        error_rate: float = 0.0,
+        key_limit: int = 1000,
+        demo_limit: int = 30,
+        image_bytes: int = 200 * 1024,
+        seed: int = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.key_limit = key_limit
+        self.demo_limit = demo_limit
+        self.image = b"\xff\xd8\xff\xe0" + bytes(max(0, image_bytes - 6)) + b"\xff\xd9"
+        self.rng = random.Random(seed)
+        self.base = ""
+        self.windows = {}  # key -> (window start, requests in window)
+        self.stats = {
+            "requests": 0,
+            "ok": 0,
+            "errors": 0,
+            "throttled": 0,
+            "images": 0,
+            "in_flight": 0,
+            "peak_in_flight": 0,
+            "by_key": {},
+        }
+        self._runner = None
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/planetary/apod", self.handle)
+        app.router.add_get("/image/{name}", self.handle_image)
+        app.router.add_get("/stats", self.handle_stats)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8766) -> str:
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        self.base = f"http://{host}:{port}"
+        return self.base
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def _delay(self) -> float:
+        return max(0.0, self.rng.gauss(self.latency, self.jitter)) if self.jitter else self.latency
+
+    def _spend(self, key: str):
+        """(limit, remaining after this request) for `key`, or remaining -1 when the budget is spent."""
+        limit = self.demo_limit if key == DEMO_KEY else self.key_limit
+        now = time.monotonic()
+        start, used = self.windows.get(key, (now, 0))
+        if now - start >= WINDOW:
+            start, used = now, 0
+        if used >= limit:
+            return limit, -1
+        self.windows[key] = (start, used + 1)
+        return limit, limit - used - 1
+
+    def entry(self, date: datetime.date) -> dict:
+        rng = random.Random(date.toordinal())
+        words = rng.choices(FILLER, k=80)
+        return {
+            "date": date.isoformat(),
+            "title": " ".join(word.capitalize() for word in words[:3]),
+            "explanation": " ".join(words),
+            "media_type": "image",
+            "service_version": "v1",
+            "url": f"{self.base}/image/{date.isoformat()}.jpg",
+            "hdurl": f"{self.base}/image/{date.isoformat()}.jpg",
+        }
+
+    @staticmethod
+    def _error(status: int, code: str, message: str, headers=None) -> web.Response:
+        return web.json_response({"error": {"code": code, "message": message}}, status=status, headers=headers)
+
+    def _body(self, query) -> object:
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        if "count" in query:
+            count = max(1, min(100, int(query["count"])))
+            span = (today - APOD_START).days
+            return [self.entry(APOD_START + datetime.timedelta(days=self.rng.randrange(span + 1))) for _ in range(count)]
+        if "start_date" in query:
+            start = datetime.date.fromisoformat(query["start_date"])
+            end = datetime.date.fromisoformat(query["end_date"]) if "end_date" in query else today
+            if start < APOD_START or end > today or start > end:
+                raise ValueError("Date must be between Jun 16, 1995 and today.")
+            return [self.entry(start + datetime.timedelta(days=i)) for i in range((end - start).days + 1)]
+        date = datetime.date.fromisoformat(query["date"]) if "date" in query else today
+        if date < APOD_START or date > today:
+            raise ValueError("Date must be between Jun 16, 1995 and today.")
+        return self.entry(date)
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats)
+
+    async def handle_image(self, request: web.Request) -> web.Response:
+        self.stats["images"] += 1
+        await asyncio.sleep(self._delay())
+        return web.Response(body=self.image, content_type="image/jpeg")
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.stats["requests"] += 1
+        self.stats["in_flight"] += 1
+        self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self.stats["in_flight"])
+        try:
+            key = request.query.get("api_key")
+            if not key:
+                return self._error(403, "API_KEY_MISSING", "No api_key was supplied.")
+            self.stats["by_key"][key] = self.stats["by_key"].get(key, 0) + 1
+            limit, remaining = self._spend(key)
+            if remaining < 0:
+                self.stats["throttled"] += 1
+                headers = {"X-RateLimit-Limit": str(limit), "X-RateLimit-Remaining": "0"}
+                return self._error(429, "OVER_RATE_LIMIT", "You have exceeded your rate limit.", headers)
+            headers = {"X-RateLimit-Limit": str(limit), "X-RateLimit-Remaining": str(remaining)}
+            await asyncio.sleep(self._delay())
+            if self.error_rate and self.rng.random() < self.error_rate:
+                self.stats["errors"] += 1
+                status = self.rng.choice((500, 503))
+                return self._error(status, "SERVER_ERROR", "mock failure", headers)
+            try:
+                body = self._body(request.query)
+            except ValueError as e:
+                return web.json_response({"code": 400, "msg": str(e)}, status=400, headers=headers)
+            self.stats["ok"] += 1
+            return web.json_response(body, headers=headers)
+        finally:
+            self.stats["in_flight"] -= 1
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency", type=float, default=300, help="mean response latency in ms")
+    parser.add_argument("--jitter", type=float, default=50, help="latency standard deviation in ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered 500/503")
+    parser.add_argument("--key-limit", type=int, default=1000, help="requests per key per hour")
+    parser.add_argument("--demo-limit", type=int, default=30, help="requests per hour for DEMO_KEY")
+    parser.add_argument("--image-kib", type=int, default=200, help="size of the served placeholder image")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def from_arguments(args: argparse.Namespace) -> MockApod:
+    return MockApod(
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        error_rate=args.error_rate,
+        key_limit=args.key_limit,
+        demo_limit=args.demo_limit,
+        image_bytes=args.image_kib * 1024,
+        seed=args.seed,
+    )
+
+
+async def serve(server: MockApod, host: str, port: int) -> None:
+    url = await server.start(host, port)
+    print(f"Mock APOD listening on {url}/planetary/apod (stats at {url}/stats)", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    add_arguments(parser)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(from_arguments(args), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
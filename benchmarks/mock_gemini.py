@@ -0,0 +1,214 @@
+"""
+Local stand-in for the Gemini REST API.
+
+Answers `POST .../models/<model>:generateContent` and
+`POST .../models/<model>:streamGenerateContent` (JSON array, or server-sent
+events with `?alt=sse`). Any other POST path is treated as generateContent,
+which is what the cog sends to custom API URLs. Latency, error rate and
+periodic 429 bursts are configurable so retry, queueing and pooling
+behaviour can be exercised offline.
+
+Run from the repository root (only aiohttp is needed):
+
+    python -m benchmarks.mock_gemini --port 8765 --latency 300 --error-rate 0.02 --burst-every 30 --burst-length 3
+
+then point a guild at it with `[p]gemini apiurl http://127.0.0.1:8765/v1beta/models/mock:generateContent`.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+
+from aiohttp import web
+
+FILLER = "the quick brown fox jumps over the lazy dog while the telescope tracks a distant comet".split()
+
+
+class MockGemini:
+    """
+    aiohttp application that behaves enough like Gemini for load tests.
+
+    `latency` and `jitter` are in seconds. Every `burst_every` seconds the
+    server answers 429 with a Retry-After header for `burst_length` seconds;
+    outside bursts, `error_rate` of requests fail with a 500 or 503.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.2,
+        jitter: float = 0.05,
+        error_rate: float = 0.0,
+        burst_every: float = 0.0,
+        burst_length: float = 0.0,
+        response_words: int = 60,
+        stream_chunks: int = 4,
+        seed: int = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.burst_every = burst_every
+        self.burst_length = burst_length
+        self.response_words = response_words
+        self.stream_chunks = max(1, stream_chunks)
+        self.rng = random.Random(seed)
+        self.started = time.monotonic()
+        self.stats = {"requests": 0, "ok": 0, "streams": 0, "errors": 0, "throttled": 0, "in_flight": 0, "peak_in_flight": 0}
+        self._runner = None
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=32 * 1024 * 1024)
+        app.router.add_post("/{tail:.*}", self.handle)
+        app.router.add_get("/stats", self.handle_stats)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8765) -> str:
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        return f"http://{host}:{port}"
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def _burst_remaining(self) -> float:
+        if not self.burst_every or not self.burst_length:
+            return 0.0
+        # Bursts close each period, so a run starts with a healthy server
+        left = self.burst_every - (time.monotonic() - self.started) % self.burst_every
+        return left if left <= self.burst_length else 0.0
+
+    def _delay(self) -> float:
+        return max(0.0, self.rng.gauss(self.latency, self.jitter)) if self.jitter else self.latency
+
+    def _text(self, body: dict) -> str:
+        try:
+            last = body["contents"][-1]["parts"][0].get("text", "")
+        except (KeyError, IndexError, TypeError):
+            last = ""
+        return f"Mock reply to: {last[:200]} " + " ".join(self.rng.choices(FILLER, k=self.response_words))
+
+    @staticmethod
+    def _chunk(text: str, prompt_tokens: int, output_tokens: int) -> dict:
+        return {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+            "usageMetadata": {
+                "promptTokenCount": prompt_tokens,
+                "candidatesTokenCount": output_tokens,
+                "totalTokenCount": prompt_tokens + output_tokens,
+            },
+        }
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats)
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        self.stats["requests"] += 1
+        self.stats["in_flight"] += 1
+        self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self.stats["in_flight"])
+        try:
+            raw = await request.read()
+            remaining = self._burst_remaining()
+            if remaining:
+                self.stats["throttled"] += 1
+                await asyncio.sleep(min(self._delay(), 0.05))
+                return web.json_response(
+                    {"error": {"code": 429, "message": "Resource has been exhausted", "status": "RESOURCE_EXHAUSTED"}},
+                    status=429,
+                    headers={"Retry-After": str(math.ceil(remaining))},
+                )
+            if self.error_rate and self.rng.random() < self.error_rate:
+                self.stats["errors"] += 1
+                await asyncio.sleep(self._delay() / 2)
+                status = self.rng.choice((500, 503))
+                return web.json_response({"error": {"code": status, "message": "mock failure"}}, status=status)
+            try:
+                body = json.loads(raw)
+            except ValueError:
+                return web.json_response({"error": {"code": 400, "message": "invalid JSON"}}, status=400)
+
+            text = self._text(body)
+            prompt_tokens = len(raw) // 4 + 1
+            output_tokens = len(text) // 4 + 1
+            if request.path.endswith(":streamGenerateContent"):
+                return await self._stream(request, text, prompt_tokens, output_tokens)
+            await asyncio.sleep(self._delay())
+            self.stats["ok"] += 1
+            return web.json_response(self._chunk(text, prompt_tokens, output_tokens))
+        finally:
+            self.stats["in_flight"] -= 1
+
+    async def _stream(self, request, text, prompt_tokens, output_tokens) -> web.StreamResponse:
+        self.stats["streams"] += 1
+        sse = request.query.get("alt") == "sse"
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream" if sse else "application/json"})
+        await resp.prepare(request)
+        words = text.split(" ")
+        step = math.ceil(len(words) / self.stream_chunks)
+        pieces = [" ".join(words[i:i + step]) for i in range(0, len(words), step)]
+        pause = self._delay() / len(pieces)
+        if not sse:
+            await resp.write(b"[")
+        for i, piece in enumerate(pieces):
+            await asyncio.sleep(pause)
+            data = json.dumps(self._chunk(piece if i == 0 else " " + piece, prompt_tokens, output_tokens))
+            if sse:
+                await resp.write(f"data: {data}\r\n\r\n".encode("utf-8"))
+            else:
+                await resp.write((data if i == 0 else "," + data).encode("utf-8"))
+        if not sse:
+            await resp.write(b"]")
+        await resp.write_eof()
+        self.stats["ok"] += 1
+        return resp
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency", type=float, default=200, help="mean response latency in ms")
+    parser.add_argument("--jitter", type=float, default=50, help="latency standard deviation in ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered 500/503")
+    parser.add_argument("--burst-every", type=float, default=0.0, help="seconds between 429 bursts (0 = never)")
+    parser.add_argument("--burst-length", type=float, default=0.0, help="length of each 429 burst in seconds")
+    parser.add_argument("--response-words", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def from_arguments(args: argparse.Namespace) -> MockGemini:
+    return MockGemini(
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        error_rate=args.error_rate,
+        burst_every=args.burst_every,
+        burst_length=args.burst_length,
+        response_words=args.response_words,
+        seed=args.seed,
+    )
+
+
+async def serve(server: MockGemini, host: str, port: int) -> None:
+    url = await server.start(host, port)
+    print(f"Mock Gemini listening on {url} (stats at {url}/stats)", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(from_arguments(args), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
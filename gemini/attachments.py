@@ -0,0 +1,177 @@
+import asyncio
+import base64
+import hashlib
+import io
+import logging
+from collections import OrderedDict
+from typing import List
+
+import aiohttp
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional, without it oversized images are skipped
+    Image = None
+
+log = logging.getLogger("red.didi.gemini")
+
+IMAGE_TYPES = {"image/png", "image/jpeg", "image/webp", "image/heic", "image/heif"}
+TEXT_TYPES = {"application/json", "application/xml", "application/x-python", "application/javascript"}
+
+MAX_INLINE_IMAGE_BYTES = 3 * 1024 * 1024  # images bigger than this are downscaled
+MAX_IMAGE_DOWNLOAD_BYTES = 20 * 1024 * 1024  # never download more than this
+MAX_TEXT_BYTES = 256 * 1024
+MAX_IMAGE_SIDE = 2048
+MAX_ATTACHMENTS = 4
+CHUNK_SIZE = 64 * 1024
+IMAGE_TOKEN_ESTIMATE = 258  # what Gemini bills for a typical image
+
+
+class AttachmentError(Exception):
+    pass
+
+
+def _mime_type(attachment) -> str:
+    return (attachment.content_type or "").split(";")[0].strip().lower()
+
+
+def is_supported(attachment) -> bool:
+    mime = _mime_type(attachment)
+    return mime in IMAGE_TYPES or mime.startswith("text/") or mime in TEXT_TYPES
+
+
+class _Base64Stream:
+    """Encodes bytes to base64 as they arrive, carrying over incomplete 3-byte groups."""
+
+    def __init__(self):
+        self._pieces: List[bytes] = []
+        self._carry = b""
+
+    def feed(self, chunk: bytes) -> None:
+        data = self._carry + chunk
+        cut = len(data) - len(data) % 3
+        self._carry = data[cut:]
+        if cut:
+            self._pieces.append(base64.b64encode(data[:cut]))
+
+    def finish(self) -> str:
+        if self._carry:
+            self._pieces.append(base64.b64encode(self._carry))
+            self._carry = b""
+        return b"".join(self._pieces).decode("ascii")
+
+
+def _downscale(raw: bytes) -> bytes:
+    """Shrink an image to fit MAX_IMAGE_SIDE / MAX_INLINE_IMAGE_BYTES as JPEG. Blocking, run in an executor."""
+    with Image.open(io.BytesIO(raw)) as image:
+        image = image.convert("RGB")
+        image.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE))
+        for quality in (85, 70, 55, 40):
+            out = io.BytesIO()
+            image.save(out, format="JPEG", quality=quality, optimize=True)
+            if out.tell() <= MAX_INLINE_IMAGE_BYTES:
+                return out.getvalue()
+            image.thumbnail((image.width * 3 // 4, image.height * 3 // 4))
+    raise AttachmentError("image is still too large after downscaling")
+
+
+class AttachmentLoader:
+    """
+    Turns Discord attachments into Gemini `inline_data` parts.
+
+    Downloads are streamed with hard byte caps and base64-encoded as they
+    arrive; oversized images are downscaled in a worker thread. Encoded parts
+    are cached by content hash (and attachment id), bounded by `max_cache_bytes`,
+    so an attachment referenced repeatedly is downloaded and encoded once.
+    """
+
+    def __init__(self, max_cache_bytes: int = 32 * 1024 * 1024):
+        self.max_cache_bytes = max_cache_bytes
+        self.cache_bytes = 0
+        self._parts: "OrderedDict[str, dict]" = OrderedDict()
+        self._ids: "OrderedDict[int, str]" = OrderedDict()
+
+    async def load_all(self, session: aiohttp.ClientSession, attachments) -> List[dict]:
+        parts = []
+        for attachment in [a for a in attachments if is_supported(a)][:MAX_ATTACHMENTS]:
+            try:
+                parts.append(await self.load(session, attachment))
+            except (AttachmentError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                log.debug("Skipping attachment %s: %s", attachment.filename, e)
+        return parts
+
+    async def load(self, session: aiohttp.ClientSession, attachment) -> dict:
+        digest = self._ids.get(attachment.id)
+        if digest is not None and digest in self._parts:
+            self._parts.move_to_end(digest)
+            return self._parts[digest]
+
+        mime = _mime_type(attachment)
+        is_image = mime in IMAGE_TYPES
+        if is_image:
+            cap = MAX_IMAGE_DOWNLOAD_BYTES if Image is not None else MAX_INLINE_IMAGE_BYTES
+        else:
+            cap = MAX_TEXT_BYTES
+        if attachment.size > cap:
+            raise AttachmentError(f"{attachment.size} bytes is over the {cap} byte limit")
+        # Only images that will need downscaling are kept as raw bytes
+        keep_raw = is_image and attachment.size > MAX_INLINE_IMAGE_BYTES
+
+        hasher = hashlib.sha256()
+        encoder = _Base64Stream()
+        raw_chunks = []
+        received = 0
+        timeout = aiohttp.ClientTimeout(total=60, sock_read=15)
+        async with session.get(attachment.url, timeout=timeout) as resp:
+            if resp.status != 200:
+                raise AttachmentError(f"download failed with status {resp.status}")
+            async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                received += len(chunk)
+                if received > cap:
+                    raise AttachmentError("download exceeded the size limit")
+                hasher.update(chunk)
+                if keep_raw:
+                    raw_chunks.append(chunk)
+                else:
+                    encoder.feed(chunk)
+
+        digest = hasher.hexdigest()
+        self._remember_id(attachment.id, digest)
+        if digest in self._parts:
+            self._parts.move_to_end(digest)
+            return self._parts[digest]
+
+        if keep_raw:
+            loop = asyncio.get_running_loop()
+            try:
+                shrunk = await loop.run_in_executor(None, _downscale, b"".join(raw_chunks))
+            except AttachmentError:
+                raise
+            except Exception as e:
+                # Formats Pillow can't open (HEIC/HEIF without a plugin), corrupt files, decompression bombs
+                raise AttachmentError(f"could not downscale image: {e!r}") from e
+            data = await loop.run_in_executor(None, lambda: base64.b64encode(shrunk).decode("ascii"))
+            mime = "image/jpeg"
+        else:
+            data = encoder.finish()
+            if not is_image:
+                mime = "text/plain"
+
+        part = {"inline_data": {"mime_type": mime, "data": data}}
+        self._store(digest, part)
+        return part
+
+    def _remember_id(self, attachment_id: int, digest: str) -> None:
+        self._ids[attachment_id] = digest
+        while len(self._ids) > 4096:
+            self._ids.popitem(last=False)
+
+    def _store(self, digest: str, part: dict) -> None:
+        size = len(part["inline_data"]["data"])
+        if size > self.max_cache_bytes:
+            return
+        self._parts[digest] = part
+        self.cache_bytes += size
+        while self.cache_bytes > self.max_cache_bytes:
+            _digest, evicted = self._parts.popitem(last=False)
+            self.cache_bytes -= len(evicted["inline_data"]["data"])
@@ -0,0 +1,50 @@
+from collections import deque
+from typing import Deque, Dict, List
+
+from .metrics import percentile
+
+# Failure kinds where another backend has a fair chance of succeeding
+FAILOVER_KINDS = {"http_429", "connect", "connection_lost", "timeout", "circuit_open"}
+
+DEFAULT_HEDGE_DELAY = 4.0  # seconds, used until a backend has enough samples
+MIN_HEDGE_DELAY = 0.5
+MAX_HEDGE_DELAY = 30.0
+MIN_SAMPLES = 20
+
+
+def can_fail_over(kind: str) -> bool:
+    return kind in FAILOVER_KINDS or kind.startswith("http_5")
+
+
+def backend_key(backend: dict) -> str:
+    return f"{backend['api_url']}|{backend['model']}"
+
+
+def guild_backends(guild_settings: dict, api_key: str, api_url: str, model: str) -> List[dict]:
+    """The primary backend followed by the guild's extra backends, in order."""
+    primary = {"api_url": api_url, "model": model, "api_key": api_key}
+    extras = [
+        {**backend, "api_key": backend.get("api_key") or api_key}
+        for backend in guild_settings.get("backends") or []
+    ]
+    return [primary] + extras
+
+
+class LatencyTracker:
+    """Recent successful latencies per backend, used to pick the hedging threshold."""
+
+    def __init__(self, samples: int = 200):
+        self.samples = samples
+        self._latencies: Dict[str, Deque[float]] = {}
+
+    def observe(self, key: str, latency: float) -> None:
+        window = self._latencies.get(key)
+        if window is None:
+            window = self._latencies[key] = deque(maxlen=self.samples)
+        window.append(latency)
+
+    def hedge_delay(self, key: str) -> float:
+        window = self._latencies.get(key)
+        if not window or len(window) < MIN_SAMPLES:
+            return DEFAULT_HEDGE_DELAY
+        return min(MAX_HEDGE_DELAY, max(MIN_HEDGE_DELAY, percentile(sorted(window), 95)))
@@ -0,0 +1,68 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+class ResponseCache:
+    """
+    In-memory TTL cache with LRU eviction for stateless Gemini replies.
+
+    Bounded both by entry count and by the total size of the cached text.
+    """
+
+    def __init__(self, ttl: float = 600.0, max_entries: int = 512, max_bytes: int = 4 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.size_bytes = 0
+        self._entries: "OrderedDict[str, Tuple[float, str, int]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(model: str, system_prompt: Optional[str], contents: list) -> str:
+        raw = json.dumps([model, system_prompt or "", contents], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires, value, _size = entry
+        if expires <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, value, size)
+        self.size_bytes += size
+        while len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size_bytes = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def _remove(self, key: str) -> None:
+        _expires, _value, size = self._entries.pop(key)
+        self.size_bytes -= size
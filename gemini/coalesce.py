@@ -0,0 +1,84 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+log = logging.getLogger("red.didi.gemini")
+
+
+class _Batch:
+    __slots__ = ("items", "started", "timer")
+
+    def __init__(self, started: float):
+        self.items: List[Any] = []
+        self.started = started
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class Coalescer:
+    """
+    Per-key debounce: items added within `window` seconds of each other are
+    handed to `callback(key, items)` as one batch.
+
+    A batch is flushed early once it holds `max_batch` items or has been open
+    for `max_wait` seconds, so a constant trickle can't delay an answer forever.
+    """
+
+    def __init__(
+        self,
+        callback: Callable[[Any, List[Any]], Awaitable[None]],
+        max_wait: float = 10.0,
+        max_batch: int = 10,
+    ):
+        self.callback = callback
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self._batches: Dict[Any, _Batch] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def add(self, key: Any, item: Any, window: float) -> None:
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = self._batches[key] = _Batch(now)
+        batch.items.append(item)
+
+        if batch.timer is not None:
+            batch.timer.cancel()
+        if len(batch.items) >= self.max_batch:
+            self._flush(key)
+            return
+        delay = max(0.0, min(window, batch.started + self.max_wait - now))
+        batch.timer = loop.call_later(delay, self._flush, key)
+
+    def pending(self, key: Any) -> int:
+        batch = self._batches.get(key)
+        return len(batch.items) if batch else 0
+
+    def _flush(self, key: Any) -> None:
+        batch = self._batches.pop(key, None)
+        if batch is None or not batch.items:
+            return
+        task = asyncio.create_task(self._run(key, batch.items))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key: Any, items: List[Any]) -> None:
+        try:
+            await self.callback(key, items)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception("Error while answering coalesced messages for %s", key)
+
+    def close(self) -> List[asyncio.Task]:
+        """Drop pending batches and cancel running callbacks; returns the cancelled tasks so they can be awaited."""
+        for batch in self._batches.values():
+            if batch.timer is not None:
+                batch.timer.cancel()
+        self._batches.clear()
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        self._tasks.clear()
+        return tasks
@@ -1,7 +1,70 @@
 import discord
 from redbot.core import commands, Config, checks
+from redbot.core.data_manager import cog_data_path
+from redbot.core.utils.chat_formatting import humanize_timedelta
 import aiohttp
+import asyncio
+import contextlib
 import datetime
+import json
+import logging
+from urllib.parse import urlparse
+
+from .attachments import IMAGE_TOKEN_ESTIMATE, AttachmentLoader
+from .backends import LatencyTracker, backend_key, can_fail_over, guild_backends
+from .cache import ResponseCache
+from .coalesce import Coalescer
+from .messages import MessageLRU
+from .metrics import MetricsRecorder, RequestRecord, write_atomic
+from .quota import QuotaExceededError, QuotaManager, estimate_tokens
+from .retrieval import HistoryRetriever
+from .retry import RETRY_STATUSES, CircuitBreaker, RetryPolicy
+from .routing import route_model
+from .scheduler import QueueFullError, RequestScheduler
+from .sessions import SESSION_GROUP, SessionStore
+from .settings import SettingsSnapshot
+
+log = logging.getLogger("red.didi.gemini")
+
+BUSY_MESSAGE = "⏳ Gemini is busy right now, please try again in a moment."
+METRICS_EXPORT_INTERVAL = 30  # seconds between Prometheus text file writes
+QUOTA_PERSIST_INTERVAL = 60  # seconds between saving quota buckets to Config
+RETRIEVAL_RECENT_TURNS = 6  # latest turns always sent when relevance retrieval is on
+REPLY_CHAIN_MAX_FETCHES = 3  # REST lookups allowed per reply chain before giving up
+REPLY_CHAIN_CONCURRENT_FETCHES = 4  # REST lookups in flight across all chains
+SESSION_FLUSH_INTERVAL = 60  # seconds between saving dirty user/thread sessions to Config
+SESSION_MODES = ("channel", "user", "thread")
+
+
+class GeminiError(Exception):
+    """A request failed; the message is safe to show to users and `kind` classifies the failure for metrics."""
+
+    def __init__(self, message: str, kind: str = "unexpected"):
+        super().__init__(message)
+        self.kind = kind
+
+
+def _burst_text(message) -> str:
+    """A coalesced message's text, naming its attachments when it has no text of its own."""
+    if message.content or not message.attachments:
+        return message.content
+    return "[attached " + ", ".join(a.filename for a in message.attachments) + "]"
+
+
+def build_contents(history: list) -> list:
+    """Convert history entries (plus any `attachments` inline_data parts) into Gemini `contents`."""
+    contents = []
+    for entry in history:
+        role = "user" if entry["role"] == "user" else "model"
+        parts = [{"text": entry["content"]}]
+        attachments = entry.get("attachments")
+        if attachments:
+            parts = (parts if entry["content"] else []) + attachments
+        contents.append({
+            "role": role,
+            "parts": parts
+        })
+    return contents
 
 
 class Gemini(commands.Cog):
@@ -16,6 +79,24 @@ class Gemini(commands.Cog):
             "api_url": "https://generativelanguage.googleapis.com/v1beta/models",  # default
             "model": "gemini-2.0-flash",  # default model
             "respond_to_mentions": True,
+            "cache_replies": False,
+            # 0 = unlimited; each limit refills evenly over `period` seconds
+            "quota": {
+                "user_requests": 0,
+                "user_tokens": 0,
+                "guild_requests": 0,
+                "guild_tokens": 0,
+                "period": 3600,
+            },
+            # Extra backends tried after api_url/model: [{"api_url", "model", "api_key"}]
+            "backends": [],
+            "hedge": False,
+            # Prompt-size routing tiers: [{"max_tokens", "max_turns", "model"}]
+            "routing": False,
+            "route_tiers": [],
+            # How many messages of a reply chain to include (1 = only the replied-to message)
+            "reply_depth": 1,
+            "attachments": True,
         }
         default_channel = {
             "history": [],
@@ -23,22 +104,204 @@ class Gemini(commands.Cog):
             "always_respond": False,
             "use_history": True,
             "auto_delete_days": None,
+            "coalesce_window": 0,
+            "model_override": None,
+            # 0 = send the full history, otherwise the k most relevant older turns + recent ones
+            "retrieval_k": 0,
+            # "channel" = one shared history, "user" = one per member, "thread" = one per Discord thread
+            "session_mode": "channel",
         }
         default_global = {
-            "blocked_users": []
+            "blocked_users": [],
+            "max_concurrent": 8,
+            "guild_concurrent": 2,
+            "guild_queue_limit": 10,
+            "global_queue_limit": 100,
+            "retry_attempts": 4,
+            "request_deadline": 30,
+            "cache_ttl": 600,
+            "connect_timeout": 10,
+            "first_byte_timeout": 30,
+            "metrics_export": False,
+            "quota_state": {},
+            "session_cache_size": 500,
+            "session_idle": 1800,
         }
 
         self.config.register_guild(**default_guild)
         self.config.register_channel(**default_channel)
         self.config.register_global(**default_global)
+        self.config.init_custom(SESSION_GROUP, 2)
+        self.config.register_custom(SESSION_GROUP, history=[])
+
+        self.scheduler = RequestScheduler()
+        self.retry_policy = RetryPolicy()
+        self.breakers = {}
+        self.session = None
+        self.timeouts = {"connect": 10, "first_byte": 30}
+        # message id -> tasks answering it, cancelled if the message is deleted or the cog unloads
+        self.inflight = {}
+        self.latencies = LatencyTracker()
+        self.retriever = HistoryRetriever()
+        self.message_cache = MessageLRU()
+        self.attachments = AttachmentLoader()
+        self._fetch_semaphore = asyncio.Semaphore(REPLY_CHAIN_CONCURRENT_FETCHES)
+        self.response_cache = ResponseCache()
+        self.coalescer = Coalescer(self._answer_coalesced)
+        self.settings = SettingsSnapshot(self.config, default_guild, default_channel)
+        self.metrics = MetricsRecorder()
+        self._export_task = None
+        self.quotas = QuotaManager()
+        self._quota_task = None
+        self.sessions = SessionStore(self.config)
+        self._session_task = None
+
+    async def cog_load(self):
+        settings = await self.config.all()
+        self.scheduler.configure(
+            global_limit=settings["max_concurrent"],
+            guild_limit=settings["guild_concurrent"],
+            guild_queue_limit=settings["guild_queue_limit"],
+            global_queue_limit=settings["global_queue_limit"],
+        )
+        self.retry_policy.max_attempts = settings["retry_attempts"]
+        self.retry_policy.deadline = settings["request_deadline"]
+        self.timeouts = {"connect": settings["connect_timeout"], "first_byte": settings["first_byte_timeout"]}
+        self.response_cache.ttl = settings["cache_ttl"]
+        await self.settings.load()
+        if settings["metrics_export"]:
+            self._start_metrics_export()
+        self.quotas.restore(settings["quota_state"])
+        self._quota_task = asyncio.create_task(self._quota_persist_loop())
+        self.sessions.max_sessions = settings["session_cache_size"]
+        self.sessions.idle_timeout = settings["session_idle"]
+        self._session_task = asyncio.create_task(self._session_flush_loop())
+
+    async def cog_unload(self):
+        cancelled = self.coalescer.close()
+        for tasks in self.inflight.values():
+            cancelled.extend(tasks)
+        self.inflight.clear()
+        for task in (self._export_task, self._quota_task, self._session_task):
+            if task is not None:
+                cancelled.append(task)
+        current = asyncio.current_task()
+        cancelled = [task for task in cancelled if task is not current]
+        for task in cancelled:
+            task.cancel()
+        # Let cancelled requests run their cleanup (quota refunds, session writes) before the final saves,
+        # so a reload's new instance never loads state the old one is still writing
+        await asyncio.gather(*cancelled, return_exceptions=True)
+        if self._quota_task is not None:
+            try:
+                await self.config.quota_state.set(self.quotas.snapshot())
+            except Exception:
+                log.exception("Failed to save Gemini quota state")
+        if self._session_task is not None:
+            try:
+                await self.sessions.flush()
+            except Exception:
+                log.exception("Failed to flush Gemini sessions")
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+
+    async def _quota_persist_loop(self):
+        while True:
+            await asyncio.sleep(QUOTA_PERSIST_INTERVAL)
+            try:
+                await self.config.quota_state.set(self.quotas.snapshot())
+            except Exception:
+                log.exception("Failed to save Gemini quota state")
+
+    async def _session_flush_loop(self):
+        while True:
+            await asyncio.sleep(SESSION_FLUSH_INTERVAL)
+            try:
+                await self.sessions.flush(evict_idle=True)
+            except Exception:
+                log.exception("Failed to flush Gemini sessions")
+
+    def _start_metrics_export(self):
+        if self._export_task is None or self._export_task.done():
+            self._export_task = asyncio.create_task(self._metrics_export_loop())
+
+    async def _metrics_export_loop(self):
+        path = str(cog_data_path(self) / "metrics.prom")
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, write_atomic, path, self.metrics.prometheus_text())
+            except Exception:
+                log.exception("Failed to write Gemini metrics export to %s", path)
+            await asyncio.sleep(METRICS_EXPORT_INTERVAL)
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession()
+        return self.session
+
+    @contextlib.contextmanager
+    def _track_inflight(self, trigger):
+        """Register the current task as answering `trigger` (a message or context) so it can be cancelled."""
+        message = getattr(trigger, "message", trigger)
+        task = asyncio.current_task()
+        tasks = self.inflight.setdefault(message.id, set())
+        tasks.add(task)
+        try:
+            yield
+        finally:
+            tasks.discard(task)
+            if not tasks:
+                self.inflight.pop(message.id, None)
+
+    def _cancel_inflight(self, message_id):
+        for task in self.inflight.pop(message_id, ()):
+            task.cancel()
+
+    def _channel_settings(self, channel) -> dict:
+        """Settings for `channel`; threads under a channel in thread mode use their parent's settings."""
+        parent = getattr(channel, "parent", None)
+        if isinstance(channel, discord.Thread) and parent is not None:
+            parent_settings = self.settings.channel(parent.id)
+            if parent_settings["session_mode"] == "thread":
+                return parent_settings
+        return self.settings.channel(channel.id)
+
+    def _session_key(self, channel, author, mode):
+        """Where a conversation's history lives: None for the channel's shared history, else a session key."""
+        if mode == "user":
+            return channel.id, author.id
+        if mode == "thread" and isinstance(channel, discord.Thread):
+            return channel.id, 0
+        return None
 
     async def is_blocked(self, user: discord.User) -> bool:
-        blocked = await self.config.blocked_users()
-        return user.id in blocked
+        return user.id in self.settings.blocked
 
     async def call_gemini(self, api_key: str, api_url: str, model: str, history: list, system_prompt: str = None):
+        """Call Gemini API with history. Errors are returned as a user-facing message."""
+        try:
+            return await self._request_gemini(api_key, api_url, model, history, system_prompt)
+        except GeminiError as e:
+            return str(e)
+
+    async def _request_gemini(
+        self,
+        api_key: str,
+        api_url: str,
+        model: str,
+        history: list,
+        system_prompt: str = None,
+        record=None,
+        max_attempts: int = None,
+        deadline: float = None,
+    ):
         """
-        Call Gemini API with history.
+        Call Gemini API with history, raising GeminiError on failure.
+        Sizes, attempts and token usage are written to `record` when one is given.
+        `max_attempts` overrides the retry policy, e.g. to fail over to another backend sooner.
+        `deadline` (event loop time) is shared by a whole failover chain; by default the
+        request gets the policy's full deadline.
         - If api_url points to Google → append /{model}:generateContent with ?key=
         - If custom API → send directly to base URL with "model" inside JSON
         """
@@ -54,16 +317,7 @@ class Gemini(commands.Cog):
 
         headers = {"Content-Type": "application/json"}
 
-        # Convert history into Gemini format
-        contents = []
-        for entry in history:
-            role = "user" if entry["role"] == "user" else "model"
-            contents.append({
-                "role": role,
-                "parts": [{"text": entry["content"]}]
-            })
-
-        payload = {"contents": contents}
+        payload = {"contents": build_contents(history)}
 
         # Put system prompt in system_instruction (official way)
         if system_prompt:
@@ -72,24 +326,243 @@ class Gemini(commands.Cog):
         if "generativelanguage.googleapis.com" not in api_url:
             payload["model"] = model
 
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, headers=headers, params=params, json=payload) as resp:
-                    if resp.status == 503:
-                        return "⚠️ Model overloaded, please try again soon"
-                    if resp.status != 200:
-                        text = await resp.text()
-                        return f"❌ Error {resp.status}: {text}"
-                    data = await resp.json()
-        except aiohttp.ClientConnectorError as e:
-            return f"❌ Could not connect to API host:\n```{e}```"
-        except Exception as e:
-            return f"❌ Unexpected error while contacting Gemini:\n```{e}```"
+        body = json.dumps(payload)
+        if record is not None:
+            record.request_bytes += len(body.encode("utf-8"))
+
+        breaker = self._breaker_for(url)
+        policy = self.retry_policy
+        loop = asyncio.get_running_loop()
+        if deadline is None:
+            deadline = loop.time() + policy.deadline
+        attempt = 0
+
+        session = await self._get_session()
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise GeminiError("⌛ Gemini took too long to answer, please try again.", kind="deadline")
+            if not breaker.allow():
+                raise GeminiError(
+                    "⚠️ Gemini API is unavailable right now, please try again later.", kind="circuit_open"
+                )
+
+            if record is not None:
+                record.attempts += 1
+            retry_after = None
+            try:
+                timeout = aiohttp.ClientTimeout(
+                    total=remaining, sock_connect=self.timeouts["connect"], sock_read=self.timeouts["first_byte"]
+                )
+                async with session.post(url, headers=headers, params=params, data=body, timeout=timeout) as resp:
+                    raw = await resp.read()
+                    if record is not None:
+                        record.response_bytes += len(raw)
+                    if resp.status == 200:
+                        data = json.loads(raw)
+                        breaker.record_success()
+                        break
+                    text = raw.decode("utf-8", errors="replace")
+                    if resp.status not in RETRY_STATUSES:
+                        breaker.record_success()
+                        raise GeminiError(f"❌ Error {resp.status}: {text}", kind=f"http_{resp.status}")
+                    if resp.status == 429:
+                        # Quota is per API key, and guilds share the host; a 429 says nothing about its health
+                        breaker.record_success()
+                    else:
+                        breaker.record_failure()
+                    retry_after = resp.headers.get("Retry-After")
+                    kind = f"http_{resp.status}"
+                    if resp.status in (429, 503):
+                        error = "⚠️ Model overloaded, please try again soon"
+                    else:
+                        error = f"❌ Error {resp.status}: {text}"
+            except aiohttp.ClientConnectorError as e:
+                breaker.record_failure()
+                kind = "connect"
+                error = f"❌ Could not connect to API host:\n```{e}```"
+            except asyncio.TimeoutError:
+                breaker.record_failure()
+                kind = "timeout"
+                error = "⌛ Gemini took too long to answer, please try again."
+            except aiohttp.ClientConnectionError as e:
+                breaker.record_failure()
+                kind = "connection_lost"
+                error = f"❌ Lost connection to API host:\n```{e}```"
+            except GeminiError:
+                raise
+            except Exception as e:
+                breaker.record_failure()
+                raise GeminiError(f"❌ Unexpected error while contacting Gemini:\n```{e}```")
+
+            attempt += 1
+            delay = policy.delay(attempt, retry_after)
+            if attempt >= (max_attempts or policy.max_attempts) or loop.time() + delay > deadline:
+                raise GeminiError(error, kind=kind)
+            log.debug("Retrying Gemini request to %s in %.2fs (attempt %s)", url, delay, attempt + 1)
+            await asyncio.sleep(delay)
+
+        if record is not None and isinstance(data, dict):
+            usage = data.get("usageMetadata") or {}
+            record.prompt_tokens = usage.get("promptTokenCount", 0)
+            record.output_tokens = usage.get("candidatesTokenCount", 0)
 
         try:
             return data["candidates"][0]["content"]["parts"][0]["text"]
-        except (KeyError, IndexError):
-            return "⚠️ API returned an unexpected response."
+        except (KeyError, IndexError, TypeError):
+            raise GeminiError("⚠️ API returned an unexpected response.", kind="bad_response")
+
+    def _breaker_for(self, url: str) -> CircuitBreaker:
+        host = urlparse(url).netloc
+        breaker = self.breakers.get(host)
+        if breaker is None:
+            breaker = self.breakers[host] = CircuitBreaker()
+        return breaker
+
+    async def _generate(self, channel, author, api_key, api_url, model, history, system_prompt, cacheable=False):
+        """
+        Run a Gemini request once the scheduler hands out a slot.
+        Raises QuotaExceededError when over quota and QueueFullError when shedding.
+        Stateless (history-free) callers may pass cacheable=True to reuse a recent identical answer.
+        """
+        guild_settings = self.settings.guild(channel.guild.id)
+        estimated = estimate_tokens(system_prompt or "") + sum(
+            estimate_tokens(h["content"]) + IMAGE_TOKEN_ESTIMATE * len(h.get("attachments") or ())
+            for h in history
+        )
+
+        override = self._channel_settings(channel)["model_override"]
+        if override or guild_settings["routing"]:
+            tiers = guild_settings["route_tiers"] if guild_settings["routing"] else []
+            routed, reason = route_model(model, tiers, estimated, len(history), override)
+            log.debug(
+                "Routing Gemini request in guild %s (%s tokens, %s turns) to %s: %s",
+                channel.guild.id, estimated, len(history), routed, reason,
+            )
+            model = routed
+
+        cache_key = None
+        if cacheable:
+            cache_key = ResponseCache.make_key(model, system_prompt, build_contents(history))
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        self.quotas.acquire(channel.guild.id, author.id, estimated, guild_settings["quota"])
+
+        record = RequestRecord(channel.guild.id, model)
+        loop = asyncio.get_running_loop()
+        queued_at = loop.time()
+        # Shed, failed or cancelled requests give their quota back, so overload doesn't drain users' budgets
+        refund = False
+        try:
+            async with self.scheduler.slot(channel.guild.id, author.id):
+                started = loop.time()
+                record.queue_wait = started - queued_at
+                backends = guild_backends(guild_settings, api_key, api_url, model)
+                try:
+                    reply_text = await self._request_backends(
+                        backends, history, system_prompt, record, hedge=guild_settings["hedge"]
+                    )
+                except GeminiError as e:
+                    record.error = e.kind
+                    refund = not record.prompt_tokens
+                    return str(e)
+                finally:
+                    record.latency = loop.time() - started
+        except QueueFullError:
+            record.error = "shed"
+            refund = True
+            raise
+        except asyncio.CancelledError:
+            record.error = "cancelled"
+            # Deleted messages and unloads cancel here; tokens are only spent if a response was metered
+            refund = not record.prompt_tokens
+            raise
+        finally:
+            self.metrics.record(record)
+            if refund:
+                self.quotas.refund(channel.guild.id, author.id, estimated)
+            elif record.prompt_tokens:
+                self.quotas.settle(
+                    channel.guild.id, author.id, record.prompt_tokens + record.output_tokens - estimated
+                )
+
+        if cache_key is not None:
+            self.response_cache.set(cache_key, reply_text)
+        return reply_text
+
+    async def _request_backend(self, backend, history, system_prompt, record, max_attempts=None, deadline=None):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        reply_text = await self._request_gemini(
+            backend["api_key"], backend["api_url"], backend["model"], history, system_prompt,
+            record=record, max_attempts=max_attempts, deadline=deadline,
+        )
+        self.latencies.observe(backend_key(backend), loop.time() - started)
+        record.model = backend["model"]
+        return reply_text
+
+    async def _request_backends(self, backends, history, system_prompt, record, hedge=False):
+        """
+        Try backends in order, failing over on 5xx/429/connection errors.
+        With `hedge`, a request still unanswered after the backend's p95 latency is
+        duplicated to the next backend, and the first successful answer wins.
+        All backends share one total deadline; no backend is started once it has passed.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.retry_policy.deadline
+        pending = set()
+        launched = 0
+        last_error = None
+
+        def launch():
+            nonlocal launched
+            backend = backends[launched]
+            launched += 1
+            # Only the last backend uses the full retry policy; earlier ones fail over straight away
+            attempts = 1 if launched < len(backends) else None
+            pending.add(asyncio.ensure_future(
+                self._request_backend(
+                    backend, history, system_prompt, record, max_attempts=attempts, deadline=deadline
+                )
+            ))
+
+        launch()
+        try:
+            while pending:
+                remaining = deadline - loop.time()
+                timeout = remaining
+                if hedge and launched < len(backends):
+                    timeout = min(remaining, self.latencies.hedge_delay(backend_key(backends[launched - 1])))
+                done, _ = await asyncio.wait(pending, timeout=max(0.0, timeout), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if loop.time() >= deadline:
+                        raise GeminiError("⌛ Gemini took too long to answer, please try again.", kind="deadline")
+                    log.debug("Hedging Gemini request to backend %s", launched + 1)
+                    launch()
+                    continue
+                for task in done:
+                    pending.discard(task)
+                    try:
+                        return task.result()
+                    except GeminiError as e:
+                        if not can_fail_over(e.kind):
+                            raise
+                        last_error = e
+                if launched < len(backends) and loop.time() < deadline:
+                    launch()
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _reply_cooldown(self, reply_to, error: QuotaExceededError):
+        if not error.notify:
+            return
+        wait = humanize_timedelta(seconds=max(1, int(error.retry_after)))
+        who = "You are" if error.scope == "user" else "This server is"
+        await reply_to.reply(f"🐢 {who} sending Gemini requests too quickly. Try again in {wait}.")
 
     # ===============================
     # Commands
@@ -106,31 +579,27 @@ class Gemini(commands.Cog):
     @checks.is_owner()
     async def block(self, ctx, user: discord.User):
         """Block a user from using Gemini features."""
-        blocked = await self.config.blocked_users()
-        if user.id in blocked:
+        if user.id in self.settings.blocked:
             await ctx.reply(f"❌ {user.mention} is already blocked.")
             return
-        blocked.append(user.id)
-        await self.config.blocked_users.set(blocked)
+        await self.settings.set_blocked(user.id, True)
         await ctx.reply(f"✅ {user.mention} has been blocked from using Gemini.")
 
     @gemini.command(name="unblock")
     @checks.is_owner()
     async def unblock(self, ctx, user: discord.User):
         """Unblock a user from using Gemini features."""
-        blocked = await self.config.blocked_users()
-        if user.id not in blocked:
+        if user.id not in self.settings.blocked:
             await ctx.reply(f"❌ {user.mention} is not blocked.")
             return
-        blocked.remove(user.id)
-        await self.config.blocked_users.set(blocked)
+        await self.settings.set_blocked(user.id, False)
         await ctx.reply(f"✅ {user.mention} has been unblocked.")
 
     @gemini.command(name="blocklist")
     @checks.is_owner()
     async def blocklist(self, ctx):
         """See the list of blocked users."""
-        blocked = await self.config.blocked_users()
+        blocked = list(self.settings.blocked)
         if not blocked:
             await ctx.reply("✅ No users are currently blocked.")
             return
@@ -146,30 +615,333 @@ class Gemini(commands.Cog):
         msg = "🚫 Blocked Users:\n" + "\n".join(users)
         await ctx.reply(msg)
 
+    # --- Owner-only load limits ---
+
+    @gemini.command(name="concurrency")
+    @checks.is_owner()
+    async def concurrency(self, ctx, total: int, per_guild: int):
+        """Set how many Gemini requests may run at once, in total and per server."""
+        if total < 1 or per_guild < 1:
+            await ctx.reply("❌ Limits must be at least 1.")
+            return
+        await self.config.max_concurrent.set(total)
+        await self.config.guild_concurrent.set(per_guild)
+        self.scheduler.configure(global_limit=total, guild_limit=per_guild)
+        await ctx.reply(f"✅ Concurrency set to **{total}** total, **{per_guild}** per server.")
+
+    @gemini.command(name="queuelimit")
+    @checks.is_owner()
+    async def queuelimit(self, ctx, per_guild: int, total: int):
+        """Set how many requests may wait in the queue per server and in total before new ones are turned away."""
+        if total < 1 or per_guild < 1:
+            await ctx.reply("❌ Limits must be at least 1.")
+            return
+        await self.config.guild_queue_limit.set(per_guild)
+        await self.config.global_queue_limit.set(total)
+        self.scheduler.configure(guild_queue_limit=per_guild, global_queue_limit=total)
+        await ctx.reply(f"✅ Queue limit set to **{per_guild}** per server, **{total}** total.")
+
+    @gemini.command(name="retry")
+    @checks.is_owner()
+    async def retry(self, ctx, attempts: int):
+        """
+        Set how many attempts a request gets on 429/5xx/connection errors.
+
+        All attempts share the total deadline set with `[p]gemini timeouts`.
+        """
+        if attempts < 1:
+            await ctx.reply("❌ Attempts must be at least 1.")
+            return
+        await self.config.retry_attempts.set(attempts)
+        self.retry_policy.max_attempts = attempts
+        await ctx.reply(
+            f"✅ Requests will try up to **{attempts}** time(s) within the **{self.retry_policy.deadline:g}s** total deadline."
+        )
+
+    @gemini.command(name="timeouts")
+    @checks.is_owner()
+    async def timeouts_cmd(self, ctx, connect: int, first_byte: int, total: int):
+        """Set the connect, first-byte and total deadlines for a Gemini request, in seconds. Retries count towards the total."""
+        if min(connect, first_byte, total) < 1:
+            await ctx.reply("❌ Timeouts must be at least 1 second.")
+            return
+        await self.config.connect_timeout.set(connect)
+        await self.config.first_byte_timeout.set(first_byte)
+        await self.config.request_deadline.set(total)
+        self.timeouts = {"connect": connect, "first_byte": first_byte}
+        self.retry_policy.deadline = total
+        await ctx.reply(f"⌛ Timeouts set: connect **{connect}s**, first byte **{first_byte}s**, total **{total}s**.")
+
+    @gemini.command(name="cachettl")
+    @checks.is_owner()
+    async def cachettl(self, ctx, seconds: int):
+        """Set how long cached reply answers are kept, in seconds."""
+        if seconds < 1:
+            await ctx.reply("❌ TTL must be at least 1 second.")
+            return
+        await self.config.cache_ttl.set(seconds)
+        self.response_cache.ttl = seconds
+        self.response_cache.clear()
+        await ctx.reply(f"✅ Cached answers now expire after **{seconds}s**.")
+
+    @gemini.command(name="cacheinfo")
+    @checks.is_owner()
+    async def cacheinfo(self, ctx):
+        """Show response cache statistics."""
+        cache = self.response_cache
+        await ctx.reply(
+            "🗃️ Response cache:\n"
+            f"Entries: **{len(cache)}** ({cache.size_bytes / 1024:.1f} KiB)\n"
+            f"Hits: **{cache.hits}** | Misses: **{cache.misses}** | Hit rate: **{cache.hit_rate:.0%}**\n"
+            f"TTL: **{int(cache.ttl)}s**"
+        )
+
+    @gemini.command(name="metricsexport")
+    @checks.is_owner()
+    async def metricsexport(self, ctx, enabled: bool):
+        """Toggle writing Prometheus-style metrics to `metrics.prom` in the cog's data folder."""
+        await self.config.metrics_export.set(enabled)
+        if enabled:
+            self._start_metrics_export()
+            path = cog_data_path(self) / "metrics.prom"
+            await ctx.reply(f"📈 Metrics will be written every {METRICS_EXPORT_INTERVAL}s to:\n```{path}```")
+        else:
+            if self._export_task:
+                self._export_task.cancel()
+                self._export_task = None
+            await ctx.reply("📈 Metrics export disabled.")
+
+    @gemini.command(name="stats")
+    @commands.has_permissions(manage_guild=True)
+    async def stats(self, ctx, scope: str = None):
+        """Show Gemini usage over the last hour. Bot owners can pass `all` to rank every server."""
+        window_minutes = int(self.metrics.window // 60)
+        if scope == "all" and await self.bot.is_owner(ctx.author):
+            summaries = self.metrics.summarize(by="guild")
+            if not summaries:
+                await ctx.reply(f"📊 No Gemini requests in the last {window_minutes} minutes.")
+                return
+            ranked = sorted(summaries.items(), key=lambda item: item[1].total_tokens, reverse=True)[:10]
+            lines = [
+                f"📊 Top servers by tokens (last {window_minutes} min) | "
+                f"active: {self.scheduler.active}, queued: {self.scheduler.queued}"
+            ]
+            for guild_id, summary in ranked:
+                guild = self.bot.get_guild(guild_id)
+                name = guild.name if guild else f"Unknown ({guild_id})"
+                lines.append(
+                    f"**{name}** — {summary.count} req, {summary.error_count} err, "
+                    f"{summary.total_tokens} tokens, p95 {summary.latency_p95:.2f}s"
+                )
+            await ctx.reply("\n".join(lines))
+            return
+
+        summaries = self.metrics.summarize(guild_id=ctx.guild.id, by="model")
+        if not summaries:
+            await ctx.reply(f"📊 No Gemini requests in this server in the last {window_minutes} minutes.")
+            return
+        active, queued = self.scheduler.guild_stats(ctx.guild.id)
+        lines = [f"📊 Gemini stats (last {window_minutes} min) | active: {active}, queued: {queued}"]
+        for model_name, summary in sorted(summaries.items()):
+            errors = ", ".join(f"{kind}: {n}" for kind, n in sorted(summary.errors.items())) or "none"
+            lines.append(
+                f"**{model_name}** — {summary.count} requests\n"
+                f"  Latency p50 {summary.latency_p50:.2f}s / p95 {summary.latency_p95:.2f}s, "
+                f"queue wait p95 {summary.queue_wait_p95:.2f}s\n"
+                f"  Tokens in/out {summary.prompt_tokens}/{summary.output_tokens}, "
+                f"sent {summary.request_bytes / 1024:.1f} KiB, received {summary.response_bytes / 1024:.1f} KiB\n"
+                f"  Errors: {errors}"
+            )
+        await ctx.reply("\n".join(lines))
+
     # --- API setup commands ---
 
     @gemini.command()
     @commands.has_permissions(administrator=True)
     async def apiset(self, ctx, api_key: str):
-        await self.config.guild(ctx.guild).api_key.set(api_key)
+        await self.settings.set_guild(ctx.guild, "api_key", api_key)
         await ctx.reply("✅ Gemini API key has been set.")
 
     @gemini.command()
     @commands.has_permissions(administrator=True)
     async def apiurl(self, ctx, url: str):
-        await self.config.guild(ctx.guild).api_url.set(url)
+        await self.settings.set_guild(ctx.guild, "api_url", url)
         await ctx.reply(f"✅ Gemini API URL set to:\n```{url}```")
 
     @gemini.command()
     @commands.has_permissions(administrator=True)
     async def model(self, ctx, model_name: str):
-        await self.config.guild(ctx.guild).model.set(model_name)
+        await self.settings.set_guild(ctx.guild, "model", model_name)
         await ctx.reply(f"✅ Gemini model set to `{model_name}`")
 
+    @gemini.group(name="quota", invoke_without_command=True)
+    @commands.has_permissions(administrator=True)
+    async def quota(self, ctx):
+        """Show this server's Gemini rate limits."""
+        limits = self.settings.guild(ctx.guild.id)["quota"]
+
+        def fmt(value):
+            return str(value) if value else "unlimited"
+
+        period = humanize_timedelta(seconds=limits["period"])
+        await ctx.reply(
+            f"🐢 Gemini quotas (per {period}):\n"
+            f"Per user: **{fmt(limits['user_requests'])}** requests, **{fmt(limits['user_tokens'])}** tokens\n"
+            f"Server: **{fmt(limits['guild_requests'])}** requests, **{fmt(limits['guild_tokens'])}** tokens"
+        )
+
+    async def _set_quota(self, guild, **changes):
+        limits = dict(self.settings.guild(guild.id)["quota"])
+        limits.update(changes)
+        await self.settings.set_guild(guild, "quota", limits)
+
+    @quota.command(name="user")
+    async def quota_user(self, ctx, requests: int, tokens: int):
+        """Limit each user to `requests` requests and `tokens` estimated tokens per period. 0 = unlimited."""
+        if requests < 0 or tokens < 0:
+            await ctx.reply("❌ Limits can't be negative.")
+            return
+        await self._set_quota(ctx.guild, user_requests=requests, user_tokens=tokens)
+        await ctx.reply("✅ Per-user quota updated.")
+
+    @quota.command(name="server")
+    async def quota_server(self, ctx, requests: int, tokens: int):
+        """Limit the whole server to `requests` requests and `tokens` estimated tokens per period. 0 = unlimited."""
+        if requests < 0 or tokens < 0:
+            await ctx.reply("❌ Limits can't be negative.")
+            return
+        await self._set_quota(ctx.guild, guild_requests=requests, guild_tokens=tokens)
+        await ctx.reply("✅ Server quota updated.")
+
+    @quota.command(name="period")
+    async def quota_period(self, ctx, minutes: int):
+        """Set the period, in minutes, over which quotas refill."""
+        if minutes < 1:
+            await ctx.reply("❌ Period must be at least 1 minute.")
+            return
+        await self._set_quota(ctx.guild, period=minutes * 60)
+        await ctx.reply(f"✅ Quotas now refill over {humanize_timedelta(seconds=minutes * 60)}.")
+
+    @gemini.group(name="backend", invoke_without_command=True)
+    @commands.has_permissions(administrator=True)
+    async def backend(self, ctx):
+        """List the API backends used by this server, in failover order."""
+        guild_settings = self.settings.guild(ctx.guild.id)
+        lines = [f"1. `{guild_settings['api_url']}` — `{guild_settings['model']}` (primary)"]
+        for index, entry in enumerate(guild_settings["backends"], start=2):
+            key_note = "own key" if entry.get("api_key") else "primary key"
+            lines.append(f"{index}. `{entry['api_url']}` — `{entry['model']}` ({key_note})")
+        hedge = "enabled" if guild_settings["hedge"] else "disabled"
+        await ctx.reply("🔀 Gemini backends:\n" + "\n".join(lines) + f"\nHedging: **{hedge}**")
+
+    @backend.command(name="add")
+    async def backend_add(self, ctx, url: str, model_name: str, api_key: str = None):
+        """Add a fallback backend. Without an API key the primary key is used."""
+        backends = list(self.settings.guild(ctx.guild.id)["backends"])
+        backends.append({"api_url": url, "model": model_name, "api_key": api_key})
+        await self.settings.set_guild(ctx.guild, "backends", backends)
+        await ctx.reply(f"✅ Added backend #{len(backends) + 1}: `{url}` — `{model_name}`")
+
+    @backend.command(name="remove")
+    async def backend_remove(self, ctx, index: int):
+        """Remove a fallback backend by its number in `[p]gemini backend`."""
+        backends = list(self.settings.guild(ctx.guild.id)["backends"])
+        if index < 2 or index > len(backends) + 1:
+            await ctx.reply("❌ Invalid backend number. The primary backend is changed with `apiurl`/`model`.")
+            return
+        removed = backends.pop(index - 2)
+        await self.settings.set_guild(ctx.guild, "backends", backends)
+        await ctx.reply(f"🗑️ Removed backend `{removed['api_url']}` — `{removed['model']}`")
+
+    @backend.command(name="hedge")
+    async def backend_hedge(self, ctx, enabled: bool):
+        """Duplicate slow requests to the next backend once they pass its p95 latency."""
+        await self.settings.set_guild(ctx.guild, "hedge", enabled)
+        await ctx.reply(f"🔀 Hedging is now **{'enabled' if enabled else 'disabled'}** for this server.")
+
+    @gemini.group(name="route", invoke_without_command=True)
+    @commands.has_permissions(administrator=True)
+    async def route(self, ctx):
+        """Show prompt-size model routing tiers for this server."""
+        guild_settings = self.settings.guild(ctx.guild.id)
+        tiers = sorted(guild_settings["route_tiers"], key=lambda t: t["max_tokens"])
+        lines = [f"🧭 Model routing is **{'enabled' if guild_settings['routing'] else 'disabled'}**"]
+        for index, tier in enumerate(tiers, start=1):
+            turns = f", ≤{tier['max_turns']} turns" if tier.get("max_turns") else ""
+            lines.append(f"{index}. ≤{tier['max_tokens']} tokens{turns} → `{tier['model']}`")
+        lines.append(f"Anything larger → `{guild_settings['model']}`")
+        await ctx.reply("\n".join(lines))
+
+    @route.command(name="toggle")
+    async def route_toggle(self, ctx):
+        """Enable or disable prompt-size routing."""
+        new_state = not self.settings.guild(ctx.guild.id)["routing"]
+        await self.settings.set_guild(ctx.guild, "routing", new_state)
+        await ctx.reply(f"🧭 Model routing is now **{'enabled' if new_state else 'disabled'}**.")
+
+    @route.command(name="add")
+    async def route_add(self, ctx, max_tokens: int, model_name: str, max_turns: int = 0):
+        """Send prompts of at most `max_tokens` estimated tokens (and `max_turns` history turns) to `model_name`."""
+        if max_tokens < 1 or max_turns < 0:
+            await ctx.reply("❌ Token and turn limits must be positive.")
+            return
+        tiers = [t for t in self.settings.guild(ctx.guild.id)["route_tiers"] if t["max_tokens"] != max_tokens]
+        tiers.append({"max_tokens": max_tokens, "max_turns": max_turns, "model": model_name})
+        tiers.sort(key=lambda t: t["max_tokens"])
+        await self.settings.set_guild(ctx.guild, "route_tiers", tiers)
+        await ctx.reply(f"✅ Prompts up to {max_tokens} tokens will use `{model_name}`.")
+
+    @route.command(name="remove")
+    async def route_remove(self, ctx, index: int):
+        """Remove a routing tier by its number in `[p]gemini route`."""
+        tiers = sorted(self.settings.guild(ctx.guild.id)["route_tiers"], key=lambda t: t["max_tokens"])
+        if index < 1 or index > len(tiers):
+            await ctx.reply("❌ Invalid tier number.")
+            return
+        removed = tiers.pop(index - 1)
+        await self.settings.set_guild(ctx.guild, "route_tiers", tiers)
+        await ctx.reply(f"🗑️ Removed tier ≤{removed['max_tokens']} tokens → `{removed['model']}`")
+
+    @gemini.command()
+    @commands.has_permissions(manage_channels=True)
+    async def channelmodel(self, ctx, model_name: str = None):
+        """Always use `model_name` in this channel, bypassing routing. Run without a model to clear."""
+        await self.settings.set_channel(ctx.channel, "model_override", model_name)
+        if model_name:
+            await ctx.reply(f"✅ This channel will always use `{model_name}`.")
+        else:
+            await ctx.reply("🧹 Channel model override cleared.")
+
+    @gemini.command()
+    @commands.has_permissions(administrator=True)
+    async def replydepth(self, ctx, depth: int):
+        """How many messages of a reply chain Gemini sees when answering a reply (1 = just the replied-to message)."""
+        if depth < 1 or depth > 10:
+            await ctx.reply("❌ Depth must be between 1 and 10.")
+            return
+        await self.settings.set_guild(ctx.guild, "reply_depth", depth)
+        await ctx.reply(f"🧵 Replies will include up to **{depth}** message(s) of the reply chain.")
+
+    @gemini.command(name="attachments")
+    @commands.has_permissions(administrator=True)
+    async def attachments_toggle(self, ctx):
+        """Toggle sending image and text attachments to Gemini."""
+        new_state = not self.settings.guild(ctx.guild.id)["attachments"]
+        await self.settings.set_guild(ctx.guild, "attachments", new_state)
+        await ctx.reply(f"📎 Attachments are now **{'sent' if new_state else 'ignored'}** in this server.")
+
+    @gemini.command()
+    @commands.has_permissions(administrator=True)
+    async def replycache(self, ctx):
+        """Toggle caching of answers to reply/mention queries (never used for chat history)."""
+        new_state = not self.settings.guild(ctx.guild.id)["cache_replies"]
+        await self.settings.set_guild(ctx.guild, "cache_replies", new_state)
+        await ctx.reply(f"🗃️ Reply caching is now **{'enabled' if new_state else 'disabled'}** for this server.")
+
     @gemini.command()
     @commands.has_permissions(manage_channels=True)
     async def system(self, ctx, *, prompt: str = None):
-        await self.config.channel(ctx.channel).system_prompt.set(prompt)
+        await self.settings.set_channel(ctx.channel, "system_prompt", prompt)
         if prompt:
             await ctx.reply(f"✅ System prompt set for this channel:\n```{prompt}```")
         else:
@@ -178,23 +950,83 @@ class Gemini(commands.Cog):
     @gemini.command()
     @commands.has_permissions(manage_messages=True)
     async def togglehistory(self, ctx):
-        current = await self.config.channel(ctx.channel).use_history()
-        new_state = not current
-        await self.config.channel(ctx.channel).use_history.set(new_state)
+        new_state = not self.settings.channel(ctx.channel.id)["use_history"]
+        await self.settings.set_channel(ctx.channel, "use_history", new_state)
         await ctx.reply(f"📜 Chat history is now **{'enabled' if new_state else 'disabled'}** for this channel.")
 
     @gemini.command()
     @commands.has_permissions(manage_channels=True)
     async def alwaysrespond(self, ctx):
-        current = await self.config.channel(ctx.channel).always_respond()
-        new_state = not current
-        await self.config.channel(ctx.channel).always_respond.set(new_state)
+        new_state = not self.settings.channel(ctx.channel.id)["always_respond"]
+        await self.settings.set_channel(ctx.channel, "always_respond", new_state)
         await ctx.reply(f"💬 Always-respond is now **{'enabled' if new_state else 'disabled'}** for this channel.")
 
+    @gemini.command()
+    @commands.has_permissions(manage_channels=True)
+    async def coalesce(self, ctx, seconds: float = 0):
+        """Answer bursts of always-respond messages sent within `seconds` of each other with one reply. 0 disables."""
+        if seconds < 0 or seconds > 10:
+            await ctx.reply("❌ Window must be between 0 and 10 seconds.")
+            return
+        await self.settings.set_channel(ctx.channel, "coalesce_window", seconds)
+        if seconds:
+            await ctx.reply(f"🧵 Messages sent within **{seconds}s** of each other will now get a single reply.")
+        else:
+            await ctx.reply("🧵 Message coalescing disabled for this channel.")
+
+    @gemini.command()
+    @commands.has_permissions(manage_channels=True)
+    async def retrieval(self, ctx, k: int = 0):
+        """Send only the `k` most relevant older turns plus the latest ones instead of the full history. 0 disables."""
+        if k < 0 or k > 50:
+            await ctx.reply("❌ k must be between 0 and 50.")
+            return
+        await self.settings.set_channel(ctx.channel, "retrieval_k", k)
+        if k:
+            await ctx.reply(
+                f"🔎 Gemini will now see the {k} most relevant past turns plus the last {RETRIEVAL_RECENT_TURNS}."
+            )
+        else:
+            await ctx.reply("🔎 Relevance retrieval disabled, the full history will be sent.")
+
+    @gemini.command(name="sessions")
+    @commands.has_permissions(manage_channels=True)
+    async def sessions_cmd(self, ctx, mode: str):
+        """
+        Choose how this channel keeps conversation history.
+
+        `channel` shares one history, `user` keeps one per member and
+        `thread` gives each thread under this channel its own.
+        """
+        mode = mode.lower()
+        if mode not in SESSION_MODES:
+            await ctx.reply(f"❌ Mode must be one of: {', '.join(SESSION_MODES)}.")
+            return
+        await self.settings.set_channel(ctx.channel, "session_mode", mode)
+        await ctx.reply(f"🧵 Conversation history is now kept per **{mode}** here.")
+
+    @gemini.command(name="sessioncache")
+    @checks.is_owner()
+    async def sessioncache(self, ctx, size: int, idle_minutes: int = 30):
+        """Set how many user/thread sessions stay in memory and after how many idle minutes they are saved and dropped."""
+        if size < 1 or idle_minutes < 1:
+            await ctx.reply("❌ Size and idle time must be at least 1.")
+            return
+        await self.config.session_cache_size.set(size)
+        await self.config.session_idle.set(idle_minutes * 60)
+        self.sessions.max_sessions = size
+        self.sessions.idle_timeout = idle_minutes * 60
+        await ctx.reply(
+            f"✅ Keeping up to **{size}** sessions in memory, idle ones are dropped after **{idle_minutes}** minute(s)."
+            f" ({len(self.sessions)} loaded now, {self.sessions.dirty} unsaved)"
+        )
+
     @gemini.command(name="clear")
     @commands.has_permissions(manage_messages=True)
     async def clear(self, ctx):
-        await self.config.channel(ctx.channel).history.set([])
+        await self.settings.set_channel(ctx.channel, "history", [])
+        await self.sessions.clear_scope(ctx.channel.id)
+        self.retriever.forget_scope(ctx.channel.id)
         await ctx.reply("🧹 Chat history cleared for this channel.")
 
     @gemini.command()
@@ -207,7 +1039,7 @@ class Gemini(commands.Cog):
     @gemini.command(name="respond")
     @commands.has_permissions(administrator=True)
     async def respond(self, ctx, toggle: bool):
-        await self.config.guild(ctx.guild).respond_to_mentions.set(toggle)
+        await self.settings.set_guild(ctx.guild, "respond_to_mentions", toggle)
         msg = "✅ Bot will respond to mentions." if toggle else "❌ Bot will ignore mentions."
         await ctx.reply(msg)
 
@@ -215,10 +1047,10 @@ class Gemini(commands.Cog):
     @commands.has_permissions(manage_channels=True)
     async def autodelete(self, ctx, days: int = None):
         if days is None:
-            await self.config.channel(ctx.channel).auto_delete_days.set(None)
+            await self.settings.set_channel(ctx.channel, "auto_delete_days", None)
             await ctx.reply("🗑️ Auto-delete disabled for this channel.")
         else:
-            await self.config.channel(ctx.channel).auto_delete_days.set(days)
+            await self.settings.set_channel(ctx.channel, "auto_delete_days", days)
             await ctx.reply(f"🗑️ Auto-delete set: Chat history will be wiped every {days} day(s).")
 
     # ===============================
@@ -227,13 +1059,22 @@ class Gemini(commands.Cog):
 
     @commands.Cog.listener("on_message_without_command")
     async def gemini_message_handler(self, message: discord.Message):
-        if message.author.bot or not message.guild:
+        if not message.guild:
+            return
+        self.message_cache.remember(message)
+        if message.author.bot:
             return
-        if await self.is_blocked(message.author):
+        if message.author.id in self.settings.blocked:
             return
 
-        if await self.config.channel(message.channel).always_respond():
-            await self._handle_message(message.channel, message.author, message.content, reply_to=message)
+        channel_settings = self._channel_settings(message.channel)
+        if channel_settings["always_respond"]:
+            window = channel_settings["coalesce_window"]
+            if window:
+                key = self._session_key(message.channel, message.author, channel_settings["session_mode"])
+                self.coalescer.add(key or message.channel.id, message, window)
+            else:
+                await self._handle_message(message.channel, message.author, message.content, reply_to=message)
             return
 
         if message.reference and (ref := message.reference.resolved) and isinstance(ref, discord.Message):
@@ -242,8 +1083,7 @@ class Gemini(commands.Cog):
                 return
 
         if self.bot.user.mention in message.content:
-            respond_enabled = await self.config.guild(message.guild).respond_to_mentions()
-            if not respond_enabled:
+            if not self.settings.guild(message.guild.id)["respond_to_mentions"]:
                 return
             content = message.clean_content.replace(self.bot.user.mention, "").strip()
 
@@ -254,19 +1094,45 @@ class Gemini(commands.Cog):
                     await self._handle_user_reply_query(message.channel, message.author, ref, content, reply_to=message)
                 return
 
-            if content:
+            if content or message.attachments:
                 await self._handle_message(message.channel, message.author, content, reply_to=message)
 
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        self.message_cache.forget(payload.message_id)
+        self._cancel_inflight(payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent):
+        for message_id in payload.message_ids:
+            self.message_cache.forget(message_id)
+            self._cancel_inflight(message_id)
+
     # ===============================
     # Core handlers
     # ===============================
 
-    async def _handle_message(self, channel, author, content, reply_to):
-        api_key = await self.config.guild(channel.guild).api_key()
-        api_url = await self.config.guild(channel.guild).api_url()
-        model = await self.config.guild(channel.guild).model()
-        system_prompt = await self.config.channel(channel).system_prompt()
-        use_history = await self.config.channel(channel).use_history()
+    async def _answer_coalesced(self, channel_id, messages):
+        """Answer a burst of always-respond messages with a single request, replying to the last one."""
+        last = messages[-1]
+        if len(messages) == 1:
+            content = last.content
+        elif len({m.author.id for m in messages}) == 1:
+            content = "\n".join(_burst_text(m) for m in messages)
+        else:
+            content = "\n".join(f"{m.author.display_name}: {_burst_text(m)}" for m in messages)
+        # An image posted on its own followed by "what is this?" must reach the model too
+        await self._handle_message(last.channel, last.author, content, reply_to=last, attachment_sources=messages)
+
+    async def _handle_message(self, channel, author, content, reply_to, attachment_sources=None):
+        guild_settings = self.settings.guild(channel.guild.id)
+        channel_settings = self._channel_settings(channel)
+        api_key = guild_settings["api_key"]
+        api_url = guild_settings["api_url"]
+        model = guild_settings["model"]
+        system_prompt = channel_settings["system_prompt"]
+        use_history = channel_settings["use_history"]
+        session_key = self._session_key(channel, author, channel_settings["session_mode"])
 
         if not api_key:
             await reply_to.reply("⚠️ No API key set. Use `?gemini apiset <API_KEY>` first.")
@@ -274,41 +1140,136 @@ class Gemini(commands.Cog):
 
         history = []
         if use_history:
-            history.extend(await self.config.channel(channel).history() or [])
+            if session_key is None:
+                history.extend(channel_settings["history"] or [])
+            else:
+                history.extend(await self.sessions.get(session_key))
 
-        auto_days = await self.config.channel(channel).auto_delete_days()
+        auto_days = channel_settings["auto_delete_days"]
         if auto_days:
             cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=auto_days)
             history = [h for h in history if "time" in h and datetime.datetime.fromisoformat(h["time"]) > cutoff]
 
-        history.append({"role": "user", "content": content, "time": datetime.datetime.utcnow().isoformat()})
+        user_entry = {"role": "user", "content": content, "time": datetime.datetime.utcnow().isoformat()}
+        context = history
+        retrieval_k = channel_settings["retrieval_k"]
+        if use_history and retrieval_k:
+            context = self.retriever.select(
+                session_key or channel.id, history, content, retrieval_k, RETRIEVAL_RECENT_TURNS
+            )
+        context = context + [user_entry]
 
         try:
-            async with channel.typing():
-                reply_text = await self.call_gemini(api_key, api_url, model, history, system_prompt)
+            with self._track_inflight(reply_to):
+                async with channel.typing():
+                    context[-1] = await self._with_attachments(
+                        channel.guild, user_entry, *(attachment_sources or (reply_to,))
+                    )
+                    reply_text = await self._generate(
+                        channel, author, api_key, api_url, model, context, system_prompt
+                    )
+        except QueueFullError:
+            await reply_to.reply(BUSY_MESSAGE)
+            return
+        except QuotaExceededError as e:
+            await self._reply_cooldown(reply_to, e)
+            return
         except Exception as e:
             await reply_to.reply(f"❌ Unexpected error: ```{e}```")
             return
 
-        history.append({"role": "assistant", "content": reply_text, "time": datetime.datetime.utcnow().isoformat()})
+        assistant_entry = {"role": "assistant", "content": reply_text, "time": datetime.datetime.utcnow().isoformat()}
+        history.extend((user_entry, assistant_entry))
         if use_history:
-            await self.config.channel(channel).history.set(history)
+            if session_key is None:
+                await self.settings.set_channel(channel, "history", history)
+            else:
+                await self.sessions.put(session_key, history)
+            self.retriever.append(session_key or channel.id, (user_entry, assistant_entry))
 
         await reply_to.reply(reply_text)
 
+    async def _with_attachments(self, guild, entry, *messages):
+        """
+        `entry` plus the supported attachments of `messages` (in order, within the
+        per-request cap) as inline_data parts, when the server allows it.
+        """
+        attachments = [a for message in messages for a in getattr(message, "message", message).attachments]
+        if not attachments or not self.settings.guild(guild.id)["attachments"]:
+            return entry
+        parts = await self.attachments.load_all(await self._get_session(), attachments)
+        return {**entry, "attachments": parts} if parts else entry
+
+    async def _reply_chain(self, message, depth):
+        """
+        Up to `depth` messages that `message` replies to, oldest first.
+        Each hop is looked up in the cog's message LRU, then the bot's message cache,
+        and only fetched over REST on a miss (capped per chain and across the cog).
+        """
+        chain = []
+        fetches = 0
+        parent_id = message.reference.message_id if message.reference else None
+        while parent_id and len(chain) < depth:
+            entry = self.message_cache.get(parent_id)
+            if entry is None:
+                cached = discord.utils.get(self.bot.cached_messages, id=parent_id)
+                if cached is not None:
+                    entry = self.message_cache.remember(cached)
+            if entry is None:
+                if fetches >= REPLY_CHAIN_MAX_FETCHES:
+                    break
+                fetches += 1
+                try:
+                    async with self._fetch_semaphore:
+                        fetched = await message.channel.fetch_message(parent_id)
+                except discord.HTTPException:
+                    break
+                entry = self.message_cache.remember(fetched)
+            chain.append(entry)
+            parent_id = entry.parent_id
+        chain.reverse()
+        return chain
+
+    async def _reply_chain_history(self, message, depth):
+        """Reply-chain ancestors of `message` as history entries (bot messages as the model's turns)."""
+        if depth < 1:
+            return []
+        history = []
+        for entry in await self._reply_chain(message, depth):
+            if entry.author_id == self.bot.user.id:
+                history.append({"role": "assistant", "content": entry.content})
+            else:
+                history.append({"role": "user", "content": f"{entry.author_name} said:\n{entry.content}"})
+        return history
+
     async def _handle_reply_query(self, channel, author, referenced_message, query, reply_to):
-        api_key = await self.config.guild(channel.guild).api_key()
-        api_url = await self.config.guild(channel.guild).api_url()
-        model = await self.config.guild(channel.guild).model()
-        system_prompt = await self.config.channel(channel).system_prompt()
+        guild_settings = self.settings.guild(channel.guild.id)
+        api_key = guild_settings["api_key"]
+        api_url = guild_settings["api_url"]
+        model = guild_settings["model"]
+        system_prompt = self._channel_settings(channel)["system_prompt"]
+        cacheable = guild_settings["cache_replies"]
 
-        temp_history = []
+        temp_history = await self._reply_chain_history(referenced_message, guild_settings["reply_depth"] - 1)
         temp_history.append({"role": "user", "content": referenced_message.content})
         temp_history.append({"role": "user", "content": query})
 
         try:
-            async with channel.typing():
-                reply_text = await self.call_gemini(api_key, api_url, model, temp_history, system_prompt)
+            with self._track_inflight(reply_to):
+                async with channel.typing():
+                    temp_history[-2:] = await asyncio.gather(
+                        self._with_attachments(channel.guild, temp_history[-2], referenced_message),
+                        self._with_attachments(channel.guild, temp_history[-1], reply_to),
+                    )
+                    reply_text = await self._generate(
+                        channel, author, api_key, api_url, model, temp_history, system_prompt, cacheable=cacheable
+                    )
+        except QueueFullError:
+            await reply_to.reply(BUSY_MESSAGE)
+            return
+        except QuotaExceededError as e:
+            await self._reply_cooldown(reply_to, e)
+            return
         except Exception as e:
             await reply_to.reply(f"❌ Unexpected error: ```{e}```")
             return
@@ -316,18 +1277,33 @@ class Gemini(commands.Cog):
         await reply_to.reply(reply_text)
 
     async def _handle_user_reply_query(self, channel, author, referenced_message, query, reply_to):
-        api_key = await self.config.guild(channel.guild).api_key()
-        api_url = await self.config.guild(channel.guild).api_url()
-        model = await self.config.guild(channel.guild).model()
-        system_prompt = await self.config.channel(channel).system_prompt()
+        guild_settings = self.settings.guild(channel.guild.id)
+        api_key = guild_settings["api_key"]
+        api_url = guild_settings["api_url"]
+        model = guild_settings["model"]
+        system_prompt = self._channel_settings(channel)["system_prompt"]
+        cacheable = guild_settings["cache_replies"]
 
-        temp_history = []
+        temp_history = await self._reply_chain_history(referenced_message, guild_settings["reply_depth"] - 1)
         temp_history.append({"role": "user", "content": f"{referenced_message.author.display_name} said:\n{referenced_message.content}"})
         temp_history.append({"role": "user", "content": query})
 
         try:
-            async with channel.typing():
-                reply_text = await self.call_gemini(api_key, api_url, model, temp_history, system_prompt)
+            with self._track_inflight(reply_to):
+                async with channel.typing():
+                    temp_history[-2:] = await asyncio.gather(
+                        self._with_attachments(channel.guild, temp_history[-2], referenced_message),
+                        self._with_attachments(channel.guild, temp_history[-1], reply_to),
+                    )
+                    reply_text = await self._generate(
+                        channel, author, api_key, api_url, model, temp_history, system_prompt, cacheable=cacheable
+                    )
+        except QueueFullError:
+            await reply_to.reply(BUSY_MESSAGE)
+            return
+        except QuotaExceededError as e:
+            await self._reply_cooldown(reply_to, e)
+            return
         except Exception as e:
             await reply_to.reply(f"❌ Unexpected error: ```{e}```")
             return
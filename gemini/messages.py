@@ -0,0 +1,49 @@
+from collections import OrderedDict
+from typing import Optional
+
+import discord
+
+
+class ChainMessage:
+    """The parts of a Discord message needed to rebuild a reply chain."""
+
+    __slots__ = ("id", "author_id", "author_name", "content", "parent_id")
+
+    def __init__(self, message: discord.Message):
+        self.id = message.id
+        self.author_id = message.author.id
+        self.author_name = message.author.display_name
+        self.content = message.content
+        self.parent_id = message.reference.message_id if message.reference else None
+
+
+class MessageLRU:
+    """Bounded cache of recently seen messages, so reply chains rarely need a REST fetch."""
+
+    def __init__(self, maxsize: int = 5000):
+        self.maxsize = maxsize
+        self._messages: "OrderedDict[int, ChainMessage]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def remember(self, message: discord.Message) -> ChainMessage:
+        entry = ChainMessage(message)
+        self._messages[entry.id] = entry
+        self._messages.move_to_end(entry.id)
+        # Discord usually ships the direct parent inline, which saves a hop later
+        parent = message.reference.resolved if message.reference else None
+        if isinstance(parent, discord.Message) and parent.id not in self._messages:
+            self._messages[parent.id] = ChainMessage(parent)
+        while len(self._messages) > self.maxsize:
+            self._messages.popitem(last=False)
+        return entry
+
+    def get(self, message_id: int) -> Optional[ChainMessage]:
+        entry = self._messages.get(message_id)
+        if entry is not None:
+            self._messages.move_to_end(message_id)
+        return entry
+
+    def forget(self, message_id: int) -> None:
+        self._messages.pop(message_id, None)
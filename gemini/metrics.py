@@ -0,0 +1,170 @@
+import math
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(values)))
+    return values[rank - 1]
+
+
+class RequestRecord:
+    """Measurements for a single Gemini request."""
+
+    __slots__ = (
+        "timestamp",
+        "guild_id",
+        "model",
+        "queue_wait",
+        "latency",
+        "attempts",
+        "request_bytes",
+        "response_bytes",
+        "prompt_tokens",
+        "output_tokens",
+        "error",
+    )
+
+    def __init__(self, guild_id: int, model: str):
+        self.timestamp = time.time()
+        self.guild_id = guild_id
+        self.model = model
+        self.queue_wait = 0.0
+        self.latency = 0.0
+        self.attempts = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.error: Optional[str] = None
+
+
+class Summary:
+    """Aggregate of a group of records."""
+
+    def __init__(self, records: List[RequestRecord]):
+        self.count = len(records)
+        self.errors: Dict[str, int] = {}
+        for record in records:
+            if record.error:
+                self.errors[record.error] = self.errors.get(record.error, 0) + 1
+        latencies = sorted(r.latency for r in records)
+        waits = sorted(r.queue_wait for r in records)
+        self.latency_p50 = percentile(latencies, 50)
+        self.latency_p95 = percentile(latencies, 95)
+        self.queue_wait_p95 = percentile(waits, 95)
+        self.prompt_tokens = sum(r.prompt_tokens for r in records)
+        self.output_tokens = sum(r.output_tokens for r in records)
+        self.request_bytes = sum(r.request_bytes for r in records)
+        self.response_bytes = sum(r.response_bytes for r in records)
+
+    @property
+    def error_count(self) -> int:
+        return sum(self.errors.values())
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.output_tokens
+
+
+class MetricsRecorder:
+    """
+    Keeps the last `window` seconds of request records (capped at
+    `max_records`) and aggregates them per guild and model on demand.
+    """
+
+    def __init__(self, window: float = 3600.0, max_records: int = 20000):
+        self.window = window
+        self._records: Deque[RequestRecord] = deque(maxlen=max_records)
+        # Lifetime counters, for Prometheus-style monotonic totals
+        self.total_requests = 0
+        self.total_errors = 0
+        self.total_tokens = 0
+
+    def record(self, record: RequestRecord) -> None:
+        self._records.append(record)
+        self.total_requests += 1
+        if record.error:
+            self.total_errors += 1
+        self.total_tokens += record.prompt_tokens + record.output_tokens
+        self._trim()
+
+    def _trim(self) -> None:
+        cutoff = time.time() - self.window
+        while self._records and self._records[0].timestamp < cutoff:
+            self._records.popleft()
+
+    def records(self, guild_id: Optional[int] = None, window: Optional[float] = None) -> Iterable[RequestRecord]:
+        self._trim()
+        cutoff = time.time() - (window if window is not None else self.window)
+        for record in self._records:
+            if record.timestamp < cutoff:
+                continue
+            if guild_id is not None and record.guild_id != guild_id:
+                continue
+            yield record
+
+    def summarize(
+        self, guild_id: Optional[int] = None, window: Optional[float] = None, by: str = "model"
+    ) -> Dict[object, Summary]:
+        """Summaries keyed by `model`, `guild` or (guild, model) when `by="both"`."""
+        groups: Dict[object, List[RequestRecord]] = {}
+        for record in self.records(guild_id, window):
+            if by == "guild":
+                key = record.guild_id
+            elif by == "both":
+                key = (record.guild_id, record.model)
+            else:
+                key = record.model
+            groups.setdefault(key, []).append(record)
+        return {key: Summary(group) for key, group in groups.items()}
+
+    def prometheus_text(self) -> str:
+        lines = [
+            "# HELP gemini_requests_total Gemini requests since the cog was loaded.",
+            "# TYPE gemini_requests_total counter",
+            f"gemini_requests_total {self.total_requests}",
+            "# HELP gemini_errors_total Failed Gemini requests since the cog was loaded.",
+            "# TYPE gemini_errors_total counter",
+            f"gemini_errors_total {self.total_errors}",
+            "# HELP gemini_tokens_total Tokens reported by usageMetadata since the cog was loaded.",
+            "# TYPE gemini_tokens_total counter",
+            f"gemini_tokens_total {self.total_tokens}",
+        ]
+        window_summaries: List[Tuple[Tuple[int, str], Summary]] = sorted(
+            self.summarize(by="both").items(), key=lambda item: item[0]
+        )
+        gauges = (
+            ("gemini_window_requests", "Requests in the rolling window.", lambda s: s.count),
+            ("gemini_window_errors", "Errors in the rolling window.", lambda s: s.error_count),
+            ("gemini_window_latency_p50_seconds", "Median upstream latency.", lambda s: s.latency_p50),
+            ("gemini_window_latency_p95_seconds", "p95 upstream latency.", lambda s: s.latency_p95),
+            ("gemini_window_queue_wait_p95_seconds", "p95 scheduler queue wait.", lambda s: s.queue_wait_p95),
+            ("gemini_window_prompt_tokens", "Prompt tokens in the rolling window.", lambda s: s.prompt_tokens),
+            ("gemini_window_output_tokens", "Output tokens in the rolling window.", lambda s: s.output_tokens),
+            ("gemini_window_request_bytes", "Request payload bytes in the rolling window.", lambda s: s.request_bytes),
+            ("gemini_window_response_bytes", "Response bytes in the rolling window.", lambda s: s.response_bytes),
+        )
+        for name, help_text, value in gauges:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for (guild_id, model), summary in window_summaries:
+                lines.append(f'{name}{{guild="{guild_id}",model="{_escape(model)}"}} {value(summary)}')
+        return "\n".join(lines) + "\n"
+
+
+def write_atomic(path: str, text: str) -> None:
+    """Write `text` to `path` via a temp file so readers never see a partial export. Blocking."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fp:
+        fp.write(text)
+    os.replace(tmp_path, path)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,130 @@
+import time
+from typing import Dict, Optional, Tuple
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token), good enough for budgeting."""
+    return len(text) // 4 + 1
+
+
+class QuotaExceededError(Exception):
+    """Raised when a user or guild has used up its quota. `notify` is False for repeat hits in one cooldown."""
+
+    def __init__(self, scope: str, retry_after: float, notify: bool = True):
+        super().__init__(f"{scope} quota exceeded")
+        self.scope = scope
+        self.retry_after = retry_after
+        self.notify = notify
+
+
+class TokenBucket:
+    """Classic token bucket; `updated` is wall-clock time so buckets survive a restart."""
+
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, capacity: float, rate: float, tokens: Optional[float] = None, updated: Optional[float] = None):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity if tokens is None else tokens
+        self.updated = time.time() if updated is None else updated
+
+    def refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` can be taken (0 if it can be taken now)."""
+        if self.tokens >= amount:
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return (min(amount, self.capacity) - self.tokens) / self.rate
+
+    @property
+    def full(self) -> bool:
+        return self.tokens >= self.capacity
+
+
+class QuotaManager:
+    """
+    Per-user and per-guild token buckets, counted both in requests and in
+    estimated tokens. Limits come from guild settings:
+    `{"user_requests", "user_tokens", "guild_requests", "guild_tokens", "period"}`,
+    where 0 means unlimited and each limit refills evenly over `period` seconds.
+    """
+
+    def __init__(self):
+        # (scope, guild_id, user_id or 0, unit) -> bucket
+        self.buckets: Dict[Tuple[str, int, int, str], TokenBucket] = {}
+        self._cooldowns: Dict[Tuple[str, int, int], float] = {}
+
+    def _bucket(self, key, limit: int, period: float, now: float) -> TokenBucket:
+        rate = limit / period
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(limit, rate, updated=now)
+        elif bucket.capacity != limit or bucket.rate != rate:
+            bucket.refill(now)
+            bucket.capacity, bucket.rate = limit, rate
+            bucket.tokens = min(bucket.tokens, limit)
+        bucket.refill(now)
+        return bucket
+
+    def acquire(self, guild_id: int, user_id: int, estimated_tokens: int, limits: dict) -> None:
+        """Take one request and `estimated_tokens` from every applicable bucket, or raise QuotaExceededError."""
+        now = time.time()
+        period = max(1, limits.get("period") or 3600)
+        wanted = []
+        for scope, owner in (("user", user_id), ("guild", 0)):
+            for unit, amount in (("requests", 1), ("tokens", estimated_tokens)):
+                limit = limits.get(f"{scope}_{unit}") or 0
+                if limit > 0:
+                    key = (scope, guild_id, owner, unit)
+                    wanted.append((scope, owner, self._bucket(key, limit, period, now), amount))
+
+        for scope, owner, bucket, amount in wanted:
+            wait = bucket.wait_time(amount)
+            if wait > 0:
+                cooldown_key = (scope, guild_id, owner)
+                notify = self._cooldowns.get(cooldown_key, 0) <= now
+                self._cooldowns[cooldown_key] = now + wait
+                raise QuotaExceededError(scope, wait, notify=notify)
+
+        for _scope, _owner, bucket, amount in wanted:
+            bucket.tokens -= amount
+
+    def refund(self, guild_id: int, user_id: int, estimated_tokens: int) -> None:
+        """Give back what `acquire` took for a request that was shed, cancelled or failed without an answer."""
+        for scope, owner in (("user", user_id), ("guild", 0)):
+            for unit, amount in (("requests", 1), ("tokens", estimated_tokens)):
+                bucket = self.buckets.get((scope, guild_id, owner, unit))
+                if bucket is not None:
+                    bucket.tokens = min(bucket.capacity, bucket.tokens + amount)
+
+    def settle(self, guild_id: int, user_id: int, token_delta: int) -> None:
+        """Correct the token buckets once the real usage is known (may leave them in debt)."""
+        if not token_delta:
+            return
+        for key in (("user", guild_id, user_id, "tokens"), ("guild", guild_id, 0, "tokens")):
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                bucket.tokens = min(bucket.capacity, bucket.tokens - token_delta)
+
+    def snapshot(self) -> dict:
+        """Serialisable state of every bucket that isn't full; full buckets are dropped from memory too."""
+        now = time.time()
+        state = {}
+        for key, bucket in list(self.buckets.items()):
+            bucket.refill(now)
+            if bucket.full:
+                del self.buckets[key]
+                continue
+            state[":".join(str(part) for part in key)] = [bucket.capacity, bucket.rate, bucket.tokens, bucket.updated]
+        self._cooldowns = {k: v for k, v in self._cooldowns.items() if v > now}
+        return state
+
+    def restore(self, state: dict) -> None:
+        for raw_key, (capacity, rate, tokens, updated) in state.items():
+            scope, guild_id, owner, unit = raw_key.split(":")
+            self.buckets[(scope, int(guild_id), int(owner), unit)] = TokenBucket(capacity, rate, tokens, updated)
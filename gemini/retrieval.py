@@ -0,0 +1,146 @@
+import math
+import re
+from collections import Counter, OrderedDict
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = frozenset(
+    "a an and are as at be but by do does for from has have how i if in is it its me my no not of on or so "
+    "that the their them then there these they this to was we were what when where which who why will with "
+    "you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in (w.lower() for w in TOKEN_RE.findall(text or "")) if len(t) > 1 and t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Incremental BM25 index over history turns.
+
+    Documents can be added and removed one at a time; once more than
+    `max_docs` are held the oldest are dropped, which bounds memory.
+    """
+
+    def __init__(self, max_docs: int = 2000, k1: float = 1.5, b: float = 0.75):
+        self.max_docs = max_docs
+        self.k1 = k1
+        self.b = b
+        self._docs: "OrderedDict[Hashable, Tuple[int, Counter]]" = OrderedDict()
+        self._postings: Dict[str, Dict[Hashable, int]] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._docs
+
+    def add(self, key: Hashable, text: str) -> None:
+        if key in self._docs:
+            self.remove(key)
+        terms = Counter(tokenize(text))
+        length = sum(terms.values())
+        self._docs[key] = (length, terms)
+        self._total_length += length
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[key] = tf
+        while len(self._docs) > self.max_docs:
+            self.remove(next(iter(self._docs)))
+
+    def remove(self, key: Hashable) -> None:
+        entry = self._docs.pop(key, None)
+        if entry is None:
+            return
+        length, terms = entry
+        self._total_length -= length
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            posting.pop(key, None)
+            if not posting:
+                del self._postings[term]
+
+    def search(self, query: str, k: int, allowed: Optional[Set[Hashable]] = None) -> List[Hashable]:
+        """Keys of the `k` best matching documents, best first."""
+        n_docs = len(self._docs)
+        if not n_docs or k <= 0:
+            return []
+        avg_length = self._total_length / n_docs or 1.0
+        scores: Dict[Hashable, float] = {}
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for key, tf in posting.items():
+                if allowed is not None and key not in allowed:
+                    continue
+                length = self._docs[key][0]
+                norm = tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / avg_length))
+                scores[key] = scores.get(key, 0.0) + idf * norm
+        return sorted(scores, key=scores.get, reverse=True)[:k]
+
+
+def turn_key(entry: dict) -> Tuple[str, str]:
+    return entry.get("time", ""), entry["role"]
+
+
+class HistoryRetriever:
+    """Per-channel BM25 indexes, with the least recently used channels evicted past `max_channels`."""
+
+    def __init__(self, max_channels: int = 256, max_docs: int = 2000):
+        self.max_channels = max_channels
+        self.max_docs = max_docs
+        self._indexes: "OrderedDict[int, BM25Index]" = OrderedDict()
+
+    def _index(self, channel_id: int, history: Iterable[dict]) -> BM25Index:
+        index = self._indexes.get(channel_id)
+        if index is None:
+            index = self._indexes[channel_id] = BM25Index(self.max_docs)
+            for entry in history:
+                index.add(turn_key(entry), entry["content"])
+            while len(self._indexes) > self.max_channels:
+                self._indexes.popitem(last=False)
+        self._indexes.move_to_end(channel_id)
+        return index
+
+    def append(self, channel_id: int, entries: Iterable[dict]) -> None:
+        """Index newly stored turns; channels that aren't indexed yet are built lazily on first query."""
+        index = self._indexes.get(channel_id)
+        if index is None:
+            return
+        for entry in entries:
+            index.add(turn_key(entry), entry["content"])
+
+    def forget(self, channel_id: int) -> None:
+        self._indexes.pop(channel_id, None)
+
+    def forget_scope(self, channel_id: int) -> None:
+        """Forget a channel's index and those of its per-user sessions (keyed `(channel_id, user_id)`)."""
+        for key in [k for k in self._indexes if k == channel_id or (isinstance(k, tuple) and k[0] == channel_id)]:
+            del self._indexes[key]
+
+    def select(self, channel_id: int, history: List[dict], query: str, k: int, recent: int) -> List[dict]:
+        """
+        The last `recent` turns plus the `k` older turns most relevant to `query`
+        (each with its question/answer partner), in chronological order.
+        """
+        if len(history) <= recent + k:
+            return list(history)
+        older, latest = history[:-recent] if recent else history, history[-recent:] if recent else []
+        positions = {turn_key(entry): i for i, entry in enumerate(older)}
+        index = self._index(channel_id, history)
+
+        chosen: Set[int] = set()
+        for key in index.search(query, k, allowed=set(positions)):
+            i = positions[key]
+            chosen.add(i)
+            # Keep question and answer together
+            if older[i]["role"] == "user" and i + 1 < len(older) and older[i + 1]["role"] != "user":
+                chosen.add(i + 1)
+            elif older[i]["role"] != "user" and i > 0 and older[i - 1]["role"] == "user":
+                chosen.add(i - 1)
+        return [older[i] for i in sorted(chosen)] + list(latest)
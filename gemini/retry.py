@@ -0,0 +1,96 @@
+import datetime
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+# Statuses worth retrying: rate limiting and upstream/server trouble
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Turn a Retry-After header (seconds or HTTP date) into seconds from now."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (when - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    """Capped exponential backoff with full jitter, bounded by an overall deadline."""
+
+    def __init__(self, max_attempts: int = 4, base_delay: float = 0.5, max_delay: float = 8.0, deadline: float = 30.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    def delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Seconds to wait before retry number `attempt` (1-based)."""
+        server_delay = parse_retry_after(retry_after)
+        if server_delay is not None:
+            return server_delay
+        cap = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, cap)
+
+
+class CircuitBreaker:
+    """
+    Per-host breaker. Only server errors and connection failures count;
+    429s are per-key quota and must not lock every guild out of the host.
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    rejects calls for `reset_timeout` seconds. It then lets a single probe
+    through: success closes it again, failure re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self._probing = False
+        now = time.monotonic()
+        # A probe that never reported back (e.g. cancelled) stops blocking after reset_timeout
+        if self._probing and now - self._probe_started < self.reset_timeout:
+            return False
+        self._probing = True
+        self._probe_started = now
+        return True
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
@@ -0,0 +1,26 @@
+from typing import List, Optional, Tuple
+
+
+def route_model(
+    default_model: str,
+    tiers: List[dict],
+    prompt_tokens: int,
+    history_turns: int,
+    override: Optional[str] = None,
+) -> Tuple[str, str]:
+    """
+    Pick a model for a request and say why.
+
+    `tiers` are `{"max_tokens", "max_turns", "model"}` entries; the smallest
+    tier whose limits fit the prompt wins (`max_turns` 0 means any length).
+    Anything larger than every tier goes to the guild's default model.
+    """
+    if override:
+        return override, "channel override"
+    for tier in sorted(tiers, key=lambda t: t["max_tokens"]):
+        if prompt_tokens > tier["max_tokens"]:
+            continue
+        if tier.get("max_turns") and history_turns > tier["max_turns"]:
+            continue
+        return tier["model"], f"≤{tier['max_tokens']} tokens"
+    return default_model, "default"
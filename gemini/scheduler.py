@@ -0,0 +1,164 @@
+import asyncio
+import contextlib
+from collections import OrderedDict, deque
+from typing import Deque, Dict
+
+
+class QueueFullError(Exception):
+    """Raised when a request is shed because the queue is already full."""
+
+
+class RequestScheduler:
+    """
+    Bounds how many Gemini requests run at once.
+
+    - At most `global_limit` requests run in total, and `guild_limit` per guild.
+    - Waiting requests are served round-robin across guilds, and round-robin
+      across users inside a guild, so one busy channel can't starve the rest.
+    - Once a guild has `guild_queue_limit` waiters (or `global_queue_limit` in
+      total), new requests are rejected with QueueFullError instead of queueing.
+    """
+
+    def __init__(
+        self,
+        global_limit: int = 8,
+        guild_limit: int = 2,
+        guild_queue_limit: int = 10,
+        global_queue_limit: int = 100,
+    ):
+        self.global_limit = global_limit
+        self.guild_limit = guild_limit
+        self.guild_queue_limit = guild_queue_limit
+        self.global_queue_limit = global_queue_limit
+
+        self._active_total = 0
+        self._active: Dict[int, int] = {}
+        # guild_id -> user_id -> waiting futures (users kept in round-robin order)
+        self._queues: Dict[int, "OrderedDict[int, Deque[asyncio.Future]]"] = {}
+        self._queued: Dict[int, int] = {}
+        self._queued_total = 0
+        # Guilds that currently have waiters, in round-robin order
+        self._ring: Deque[int] = deque()
+
+    def configure(self, **limits) -> None:
+        for name, value in limits.items():
+            if value is not None:
+                setattr(self, name, max(1, int(value)))
+        self._dispatch()
+
+    @property
+    def active(self) -> int:
+        return self._active_total
+
+    @property
+    def queued(self) -> int:
+        return self._queued_total
+
+    def guild_stats(self, guild_id: int):
+        return self._active.get(guild_id, 0), self._queued.get(guild_id, 0)
+
+    @contextlib.asynccontextmanager
+    async def slot(self, guild_id: int, user_id: int):
+        await self.acquire(guild_id, user_id)
+        try:
+            yield
+        finally:
+            self.release(guild_id)
+
+    async def acquire(self, guild_id: int, user_id: int) -> None:
+        if guild_id not in self._queues and self._has_capacity(guild_id):
+            self._grant(guild_id)
+            return
+
+        if (
+            self._queued.get(guild_id, 0) >= self.guild_queue_limit
+            or self._queued_total >= self.global_queue_limit
+        ):
+            raise QueueFullError()
+
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(guild_id, user_id, future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was granted just as we got cancelled, hand it back
+                self.release(guild_id)
+            else:
+                self._discard(guild_id, user_id, future)
+            raise
+
+    def release(self, guild_id: int) -> None:
+        self._active_total -= 1
+        remaining = self._active.get(guild_id, 1) - 1
+        if remaining > 0:
+            self._active[guild_id] = remaining
+        else:
+            self._active.pop(guild_id, None)
+        self._dispatch()
+
+    # --- internals ---
+
+    def _has_capacity(self, guild_id: int) -> bool:
+        return (
+            self._active_total < self.global_limit
+            and self._active.get(guild_id, 0) < self.guild_limit
+        )
+
+    def _grant(self, guild_id: int) -> None:
+        self._active_total += 1
+        self._active[guild_id] = self._active.get(guild_id, 0) + 1
+
+    def _enqueue(self, guild_id: int, user_id: int, future: asyncio.Future) -> None:
+        users = self._queues.get(guild_id)
+        if users is None:
+            users = self._queues[guild_id] = OrderedDict()
+            self._ring.append(guild_id)
+        users.setdefault(user_id, deque()).append(future)
+        self._queued[guild_id] = self._queued.get(guild_id, 0) + 1
+        self._queued_total += 1
+
+    def _discard(self, guild_id: int, user_id: int, future: asyncio.Future) -> None:
+        users = self._queues.get(guild_id)
+        if not users or user_id not in users:
+            return
+        try:
+            users[user_id].remove(future)
+        except ValueError:
+            return
+        self._pop_bookkeeping(guild_id, user_id)
+
+    def _pop_bookkeeping(self, guild_id: int, user_id: int) -> None:
+        users = self._queues[guild_id]
+        if not users[user_id]:
+            del users[user_id]
+        if not users:
+            del self._queues[guild_id]
+            self._ring.remove(guild_id)
+        self._queued_total -= 1
+        remaining = self._queued[guild_id] - 1
+        if remaining > 0:
+            self._queued[guild_id] = remaining
+        else:
+            del self._queued[guild_id]
+
+    def _dispatch(self) -> None:
+        while self._ring and self._active_total < self.global_limit:
+            for _ in range(len(self._ring)):
+                guild_id = self._ring[0]
+                self._ring.rotate(-1)
+                if self._active.get(guild_id, 0) < self.guild_limit:
+                    break
+            else:
+                return  # every waiting guild is at its own cap
+
+            users = self._queues[guild_id]
+            user_id, waiters = next(iter(users.items()))
+            future = waiters.popleft()
+            users.move_to_end(user_id)
+            self._pop_bookkeeping(guild_id, user_id)
+
+            if future.done():
+                continue
+            self._grant(guild_id)
+            future.set_result(None)
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+log = logging.getLogger("red.didi.gemini")
+
+SESSION_GROUP = "SESSION"
+# (channel or thread id, user id or 0 for a whole thread)
+SessionKey = Tuple[int, int]
+
+
+class _Session:
+    __slots__ = ("history", "dirty", "last_used")
+
+    def __init__(self, history: List[dict]):
+        self.history = history
+        self.dirty = False
+        self.last_used = time.monotonic()
+
+
+class SessionStore:
+    """
+    Per-user and per-thread conversation histories, kept in a bounded LRU.
+
+    Sessions are read from a Config custom group the first time they are
+    used (concurrent first reads share one load) and served from memory
+    after that. Updates only mark a session dirty; dirty sessions are
+    written back when they fall out of the LRU, on `flush()`, and before an
+    idle session is evicted.
+    """
+
+    def __init__(self, config, max_sessions: int = 500, idle_timeout: float = 1800.0):
+        self.config = config
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions: "OrderedDict[SessionKey, _Session]" = OrderedDict()
+        self._loading: Dict[SessionKey, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    @property
+    def dirty(self) -> int:
+        return sum(1 for session in self._sessions.values() if session.dirty)
+
+    def _group(self, key: SessionKey):
+        return self.config.custom(SESSION_GROUP, str(key[0]), str(key[1]))
+
+    async def get(self, key: SessionKey) -> List[dict]:
+        """A copy of the session's history, loading it from Config on a miss."""
+        session = self._sessions.get(key)
+        if session is None:
+            loading = self._loading.get(key)
+            if loading is None:
+                loading = self._loading[key] = asyncio.ensure_future(self._group(key).history())
+                try:
+                    history = await loading
+                finally:
+                    del self._loading[key]
+                # A put() may have landed while we were reading
+                if key not in self._sessions:
+                    self._sessions[key] = _Session(history)
+                    await self._shrink()
+            else:
+                await asyncio.shield(loading)
+            session = self._sessions.get(key)
+            if session is None:
+                return []
+        self._sessions.move_to_end(key)
+        session.last_used = time.monotonic()
+        return list(session.history)
+
+    async def put(self, key: SessionKey, history: List[dict]) -> None:
+        session = self._sessions.get(key)
+        if session is None:
+            session = self._sessions[key] = _Session(history)
+        else:
+            session.history = history
+            session.last_used = time.monotonic()
+            self._sessions.move_to_end(key)
+        session.dirty = True
+        await self._shrink()
+
+    async def clear_scope(self, scope_id: int) -> None:
+        """Drop every session of a channel or thread, in memory and in Config."""
+        for key in [key for key in self._sessions if key[0] == scope_id]:
+            del self._sessions[key]
+        await self.config.custom(SESSION_GROUP, str(scope_id)).clear()
+
+    async def flush(self, evict_idle: bool = False) -> None:
+        """Write every dirty session back to Config, optionally evicting the idle ones afterwards."""
+        cutoff = time.monotonic() - self.idle_timeout
+        for key, session in list(self._sessions.items()):
+            if session.dirty:
+                await self._write(key, session)
+            if evict_idle and session.last_used < cutoff and self._sessions.get(key) is session and not session.dirty:
+                del self._sessions[key]
+
+    async def _shrink(self) -> None:
+        while len(self._sessions) > self.max_sessions:
+            key, session = self._sessions.popitem(last=False)
+            if session.dirty:
+                await self._write(key, session)
+
+    async def _write(self, key: SessionKey, session: _Session) -> None:
+        history = session.history
+        session.dirty = False
+        try:
+            if history:
+                await self._group(key).history.set(history)
+            else:
+                await self._group(key).clear()
+        except Exception:
+            session.dirty = True
+            log.exception("Failed to save Gemini session %s", key)
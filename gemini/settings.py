@@ -0,0 +1,53 @@
+from typing import Dict
+
+
+class SettingsSnapshot:
+    """
+    In-memory copy of the Gemini guild/channel settings and the blocklist.
+
+    Everything is loaded once with bulk reads, and every write made through
+    this class goes to Config and the snapshot together, so the message
+    listener never has to await Config. Guilds and channels without stored
+    data simply resolve to the registered defaults.
+    """
+
+    def __init__(self, config, guild_defaults: dict, channel_defaults: dict):
+        self.config = config
+        self.guild_defaults = guild_defaults
+        self.channel_defaults = channel_defaults
+        # dict keys give O(1) lookups while keeping the order users were blocked in
+        self.blocked: Dict[int, None] = {}
+        self._guilds: Dict[int, dict] = {}
+        self._channels: Dict[int, dict] = {}
+
+    async def load(self) -> None:
+        self.blocked = dict.fromkeys(await self.config.blocked_users())
+        self._guilds = {
+            guild_id: {**self.guild_defaults, **data}
+            for guild_id, data in (await self.config.all_guilds()).items()
+        }
+        self._channels = {
+            channel_id: {**self.channel_defaults, **data}
+            for channel_id, data in (await self.config.all_channels()).items()
+        }
+
+    def guild(self, guild_id: int) -> dict:
+        return self._guilds.get(guild_id, self.guild_defaults)
+
+    def channel(self, channel_id: int) -> dict:
+        return self._channels.get(channel_id, self.channel_defaults)
+
+    async def set_guild(self, guild, key: str, value) -> None:
+        await self.config.guild(guild).set_raw(key, value=value)
+        self._guilds.setdefault(guild.id, dict(self.guild_defaults))[key] = value
+
+    async def set_channel(self, channel, key: str, value) -> None:
+        await self.config.channel(channel).set_raw(key, value=value)
+        self._channels.setdefault(channel.id, dict(self.channel_defaults))[key] = value
+
+    async def set_blocked(self, user_id: int, blocked: bool) -> None:
+        if blocked:
+            self.blocked[user_id] = None
+        else:
+            self.blocked.pop(user_id, None)
+        await self.config.blocked_users.set(list(self.blocked))